@@ -0,0 +1,327 @@
+import abc
+import datetime
+import itertools
+import re
+import sqlite3
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+import pymysql
+
+from schema import COLUMNS_QUERY, INDEXES_QUERY
+
+# Key-value pairs
+KV = Dict[str, Any]
+
+# Runs a query with placeholder arguments and returns its rows as dicts
+Execute = Callable[[str, List], List[KV]]
+
+
+class Backend(abc.ABC):
+	"""The database-specific parts of DB: how to connect, and what differs between SQL dialects.
+
+	Connections must behave like pymysql connections as far as DB uses them: cursor(cursor_class),
+	begin, commit, rollback, ping, escape and close, with cursors that take %s placeholders.
+	"""
+
+	# Errors after which a connection can no longer be trusted and must be thrown away
+	broken_connection_errors: Tuple[Type[BaseException], ...] = ()
+	# Errors raised when a statement violates a constraint, e.g. a duplicate key, or a value
+	# doesn't fit its column, e.g. a string that is too long. These are the client's fault,
+	# unlike other database errors.
+	integrity_errors: Tuple[Type[BaseException], ...] = ()
+	# Upper bound on the size of the connection pool, if the backend can't use more
+	max_connections: Optional[int] = None
+	# Whether SELECT ... FOR UPDATE is supported
+	select_for_update = True
+
+	@abc.abstractmethod
+	def connect(self) -> Any:
+		"""Opens a new connection."""
+
+	@abc.abstractmethod
+	def max_allowed_packet(self, cur: Any) -> int:
+		"""The longest statement the database accepts, in bytes."""
+
+	@abc.abstractmethod
+	def schema_rows(self, execute: Execute) -> Tuple[List[KV], List[KV]]:
+		"""Reads the tables' columns and indexes, as the rows of COLUMNS_QUERY and INDEXES_QUERY would be."""
+
+
+class MySQLBackend(Backend):
+	"""MySQL through pymysql."""
+
+	broken_connection_errors = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+	# DataError covers 1406 (data too long), 1265 (data truncated) and 1366 (incorrect value)
+	integrity_errors = (pymysql.err.IntegrityError, pymysql.err.DataError)
+
+	def __init__(self, host: str, port: int, user: str, password: str, database: str):
+		self.host = host
+		self.port = port
+		self.user = user
+		self.password = password
+		self.database = database
+
+	def connect(self) -> pymysql.connections.Connection:
+		return pymysql.connect(
+			host=self.host,
+			port=self.port,
+			user=self.user,
+			password=self.password,
+			database=self.database,
+			cursorclass=pymysql.cursors.DictCursor,
+			autocommit=True,
+			# Report rows matched rather than rows changed, so an update that sets a row to its
+			# current values still counts it, and 0 reliably means no row matched the filters.
+			client_flag=pymysql.constants.CLIENT.FOUND_ROWS,
+		)
+
+	def max_allowed_packet(self, cur: pymysql.cursors.Cursor) -> int:
+		cur.execute("SELECT @@max_allowed_packet AS max_allowed_packet")
+		return int(cur.fetchone()["max_allowed_packet"])
+
+	def schema_rows(self, execute: Execute) -> Tuple[List[KV], List[KV]]:
+		return execute(COLUMNS_QUERY, [self.database]), execute(INDEXES_QUERY, [self.database])
+
+
+# --- SQLITE ---
+
+# The HW2 tables in SQLite's dialect. The CHECK constraints stand in for MySQL's YEAR range
+# and ENUM, and NOCASE for MySQL's case-insensitive default collation.
+HW2_TABLES_SQLITE = """
+CREATE TABLE IF NOT EXISTS student (
+	student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+	first_name VARCHAR(255),
+	middle_name VARCHAR(255),
+	last_name VARCHAR(255),
+	email VARCHAR(255) UNIQUE NOT NULL COLLATE NOCASE,
+	enrollment_year YEAR CHECK (enrollment_year BETWEEN 2016 AND 2023)
+);
+CREATE TABLE IF NOT EXISTS employee (
+	employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
+	first_name VARCHAR(255),
+	middle_name VARCHAR(255),
+	last_name VARCHAR(255),
+	email VARCHAR(255) UNIQUE NOT NULL COLLATE NOCASE,
+	employee_type VARCHAR(255) NOT NULL CHECK (employee_type IN ('Professor', 'Lecturer', 'Staff'))
+);
+"""
+
+# A %s placeholder, or a %% standing for a literal %
+PLACEHOLDER_PATTERN = re.compile(r"%([s%])")
+
+# Numbers in-memory databases, so each SQLiteBackend(":memory:") gets a database of its own
+_memory_database_ids = itertools.count()
+
+# SQLite's default SQLITE_MAX_SQL_LENGTH, for Pythons without Connection.getlimit
+SQLITE_MAX_SQL_LENGTH = 1_000_000_000
+
+def to_qmark(query: str) -> str:
+	"""Rewrites a query from pymysql's %s placeholders to sqlite3's ? placeholders."""
+	return PLACEHOLDER_PATTERN.sub(lambda m: "?" if m.group(1) == "s" else "%", query)
+
+def sqlite_literal(value: Any) -> str:
+	"""Escapes value as an SQLite literal. Tuples become parenthesized lists, as with pymysql."""
+	if isinstance(value, (tuple, list)):
+		return "(" + ",".join(sqlite_literal(v) for v in value) + ")"
+	if value is None:
+		return "NULL"
+	if isinstance(value, bool):
+		return "1" if value else "0"
+	if isinstance(value, (int, float)):
+		return repr(value)
+	if isinstance(value, Decimal):
+		return str(value)
+	if isinstance(value, (bytes, bytearray)):
+		return "X'" + bytes(value).hex() + "'"
+	if isinstance(value, (datetime.date, datetime.time)):
+		value = value.isoformat(" ") if isinstance(value, datetime.datetime) else value.isoformat()
+	return "'" + str(value).replace("'", "''") + "'"
+
+
+class SQLiteCursor:
+	"""A sqlite3 cursor that looks like a pymysql one: %s placeholders, execute returning a row
+	count, and dict or tuple rows depending on the pymysql cursor class it stands in for.
+	"""
+
+	def __init__(self, connection: "SQLiteConnection", as_dicts: bool, buffered: bool):
+		self.connection = connection
+		self._cursor = connection.raw.cursor()
+		self._as_dicts = as_dicts
+		self._buffered = buffered
+		self._names: List[str] = []
+		self._rows: Iterator[Tuple] = iter(())
+
+	@property
+	def description(self) -> Optional[Sequence[Tuple]]:
+		return self._cursor.description
+
+	@property
+	def lastrowid(self) -> Optional[int]:
+		return self._cursor.lastrowid
+
+	@property
+	def rowcount(self) -> int:
+		return self._cursor.rowcount
+
+	def execute(self, query: str, args: Optional[Sequence] = None) -> int:
+		"""Executes query. Like pymysql, only rewrites placeholders (and %%) if args is given."""
+		if args is None:
+			self._cursor.execute(query)
+		else:
+			self._cursor.execute(to_qmark(query), tuple(args))
+
+		if self._cursor.description is None:
+			self._names, self._rows = [], iter(())
+			return self._cursor.rowcount
+		self._names = [column[0] for column in self._cursor.description]
+		if not self._buffered:
+			self._rows = iter(self._cursor)
+			return 0
+		# Like pymysql's buffered cursors, read the whole result now so the row count is known
+		rows = self._cursor.fetchall()
+		self._rows = iter(rows)
+		return len(rows)
+
+	def _convert(self, rows: Sequence[Tuple]) -> List[Any]:
+		if self._as_dicts:
+			return [dict(zip(self._names, row)) for row in rows]
+		return list(rows)
+
+	def fetchone(self) -> Optional[Any]:
+		row = next(self._rows, None)
+		if row is None:
+			return None
+		return self._convert([row])[0]
+
+	def fetchmany(self, size: int = 1) -> List[Any]:
+		return self._convert(list(itertools.islice(self._rows, size)))
+
+	def fetchall(self) -> List[Any]:
+		return self._convert(list(self._rows))
+
+	def close(self):
+		self._cursor.close()
+
+
+class SQLiteConnection:
+	"""A sqlite3 connection with the parts of the pymysql connection interface that DB uses."""
+
+	def __init__(self, raw: sqlite3.Connection):
+		self.raw = raw
+
+	def cursor(self, cursor_class: Optional[Type[pymysql.cursors.Cursor]] = None) -> SQLiteCursor:
+		"""Opens a cursor that behaves like cursor_class. Defaults to pymysql's DictCursor."""
+		if cursor_class is None:
+			cursor_class = pymysql.cursors.DictCursor
+		return SQLiteCursor(
+			self,
+			as_dicts=issubclass(cursor_class, pymysql.cursors.DictCursorMixin),
+			buffered=not issubclass(cursor_class, pymysql.cursors.SSCursor),
+		)
+
+	def begin(self):
+		# IMMEDIATE takes the write lock up front, which stands in for SELECT ... FOR UPDATE
+		self.raw.execute("BEGIN IMMEDIATE")
+
+	def commit(self):
+		self.raw.commit()
+
+	def rollback(self):
+		self.raw.rollback()
+
+	def ping(self, reconnect: bool = False):
+		self.raw.execute("SELECT 1")
+
+	def escape(self, value: Any) -> str:
+		return sqlite_literal(value)
+
+	def close(self):
+		self.raw.close()
+
+
+class SQLiteBackend(Backend):
+	"""An embedded SQLite database, for running without a MySQL server.
+
+	File databases are opened in WAL mode, so readers don't block each other or the writer.
+	An in-memory database (":memory:") lives as long as the backend, and is used over a single
+	connection at a time, since SQLite locks shared in-memory databases a table at a time.
+
+	:param path: The database file, or ":memory:"
+	:param read_only: Opens the file read-only, e.g. for a local read replica
+	:param init_script: SQL run on every new connection, e.g. HW2_TABLES_SQLITE
+	:param busy_timeout: Seconds a writer waits for another writer's lock before failing
+	"""
+
+	# sqlite3 raises OperationalError for ordinary SQL errors too, so only InterfaceError
+	# (a closed or unusable connection) means the connection is broken
+	broken_connection_errors = (sqlite3.InterfaceError,)
+	integrity_errors = (sqlite3.IntegrityError, sqlite3.DataError)
+	select_for_update = False
+
+	def __init__(self, path: str, read_only: bool = False, init_script: Optional[str] = None, busy_timeout: float = 5.0):
+		self.read_only = read_only
+		self.init_script = init_script
+		self.busy_timeout = busy_timeout
+		self._anchor: Optional[sqlite3.Connection] = None
+		if path == ":memory:":
+			# A named in-memory database is shared by the connections of this process and
+			# lasts while one of them is open, so the backend holds one open
+			self.uri = f"file:hw2-{next(_memory_database_ids)}?mode=memory&cache=shared"
+			self.max_connections = 1
+			self._anchor = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+		else:
+			self.uri = f"file:{path}?mode=ro" if read_only else f"file:{path}"
+
+	def connect(self) -> SQLiteConnection:
+		# isolation_level=None is autocommit, as with MySQL; DB begins transactions itself
+		raw = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+		if not self.read_only:
+			if self._anchor is None:
+				raw.execute("PRAGMA journal_mode=WAL")
+			if self.init_script:
+				raw.executescript(self.init_script)
+		raw.execute("PRAGMA foreign_keys=ON")
+		return SQLiteConnection(raw)
+
+	def max_allowed_packet(self, cur: SQLiteCursor) -> int:
+		raw = cur.connection.raw
+		if hasattr(raw, "getlimit"):
+			return raw.getlimit(sqlite3.SQLITE_LIMIT_SQL_LENGTH)
+		return SQLITE_MAX_SQL_LENGTH
+
+	def schema_rows(self, execute: Execute) -> Tuple[List[KV], List[KV]]:
+		tables = execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name", [])
+		column_rows, index_rows = [], []
+		for table in (row["name"] for row in tables):
+			if table.startswith("sqlite_"):
+				continue
+			quoted = '"' + table.replace('"', '""') + '"'
+
+			primary_key = []
+			for column in execute(f"PRAGMA table_info({quoted})", []):
+				column_rows.append({
+					"table_name": table,
+					"column_name": column["name"],
+					# Declared types keep their length, e.g. VARCHAR(255)
+					"data_type": column["type"].split("(")[0].strip().lower(),
+					"is_nullable": "NO" if column["notnull"] or column["pk"] else "YES",
+				})
+				if column["pk"]:
+					primary_key.append((column["pk"], column["name"]))
+			for _, column in sorted(primary_key):
+				index_rows.append({"table_name": table, "index_name": "PRIMARY", "column_name": column, "non_unique": 0})
+
+			for index in execute(f"PRAGMA index_list({quoted})", []):
+				# The primary key is covered above; partial indexes don't make their columns unique
+				if index["origin"] == "pk" or index["partial"]:
+					continue
+				quoted_index = '"' + index["name"].replace('"', '""') + '"'
+				for column in execute(f"PRAGMA index_info({quoted_index})", []):
+					index_rows.append({
+						"table_name": table,
+						"index_name": index["name"],
+						"column_name": column["name"],
+						"non_unique": 0 if index["unique"] else 1,
+					})
+		return column_rows, index_rows
@@ -0,0 +1,99 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from backends import HW2_TABLES_SQLITE, Backend, SQLiteBackend, sqlite_literal, to_qmark
+from db import COLUMNS, DB, TUPLES, BatchError
+
+
+class DialectTest(unittest.TestCase):
+    def test_to_qmark(self):
+        self.assertEqual("SELECT * FROM student WHERE email = ? AND name LIKE 'a%'",
+                         to_qmark("SELECT * FROM student WHERE email = %s AND name LIKE 'a%%'"))
+
+    def test_sqlite_literal(self):
+        self.assertEqual("(1,'O''Hara',NULL,1,X'0a')", sqlite_literal((1, "O'Hara", None, True, b"\n")))
+        self.assertEqual("'2024-02-01'", sqlite_literal(datetime.date(2024, 2, 1)))
+
+
+class BackendTest(unittest.TestCase):
+    def test_incomplete_backend_cannot_be_created(self):
+        class NoSchemaBackend(Backend):
+            def connect(self):
+                pass
+
+            def max_allowed_packet(self, cur):
+                return 1 << 20
+
+        with self.assertRaises(TypeError):
+            NoSchemaBackend()
+
+
+class SQLiteDBTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DB(backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE), max_connections=4)
+
+    def tearDown(self):
+        self.db.pool.close()
+
+    def insert_students(self, n):
+        rows = [{"first_name": f"n{i}", "email": f"{i}@x.com", "enrollment_year": 2016 + i % 8} for i in range(n)]
+        return self.db.insert_many("student", rows, batch_size=10)
+
+    def test_in_memory_database_uses_one_connection(self):
+        self.assertEqual(1, self.db.pool.max_size)
+
+    def test_load_schema(self):
+        schema = self.db.load_schema()
+        self.assertEqual({"student", "employee"}, set(schema))
+        self.assertEqual(["student_id"], schema["student"].primary_key)
+        self.assertEqual(["email"], schema["student"].unique_columns)
+        self.assertEqual("year", schema["student"].columns["enrollment_year"].data_type)
+
+    def test_crud(self):
+        self.assertEqual([10, 10, 5], self.insert_students(25))
+        self.assertEqual(1, self.db.insert("student", {"first_name": "Joe", "email": "joe@x.com"}))
+        self.assertEqual([{"student_id": 26, "first_name": "Joe"}], self.db.select("student", ["student_id", "first_name"], {"email": "joe@x.com"}))
+        # Rows matched, not rows changed, as with MySQL's FOUND_ROWS
+        self.assertEqual(1, self.db.update("student", {"first_name": "Joe"}, {"student_id": "26"}))
+        self.assertEqual(1, self.db.delete("student", {"student_id": 26}))
+        self.assertEqual(0, self.db.delete("student", {"student_id": 26}))
+
+    def test_select_formats_and_pages(self):
+        self.insert_students(5)
+        self.assertEqual(["student_id"], self.db.select("student", ["student_id"], {}, result_format=TUPLES)[0])
+        self.assertEqual([1, 2, 3, 4, 5], list(self.db.select("student", ["student_id"], {}, result_format=COLUMNS)["student_id"]))
+        page = self.db.select("student", ["student_id"], {}, ["student_id"], 2, [2])
+        self.assertEqual([{"student_id": 3}, {"student_id": 4}], page)
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in self.db.iter_select_chunks("student", None, {}, 2)])
+
+    def test_batches(self):
+        self.insert_students(3)
+        with self.assertRaises(BatchError) as e:
+            # The email column is NOCASE, like MySQL's default collation
+            self.db.insert_batch("student", [{"email": "new@x.com"}, {"email": "0@X.COM"}], ["email"])
+        self.assertEqual([1], list(e.exception.errors))
+        self.assertEqual(3, len(self.db.select("student", None, {})))
+
+        self.assertEqual(2, self.db.update_batch("student", "student_id", [{"student_id": 1, "first_name": "a"}, {"student_id": 2, "first_name": "b"}]))
+        self.assertEqual(["a", "b"], [row["first_name"] for row in self.db.select("student", ["first_name"], {}, ["student_id"], 2)])
+        self.assertEqual(2, self.db.delete_batch("student", "student_id", [1, 2]))
+
+
+class SQLiteFileTest(unittest.TestCase):
+    def test_read_only_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "hw2.db")
+            writer = DB(backend=SQLiteBackend(path, init_script=HW2_TABLES_SQLITE))
+            writer.insert("employee", {"email": "e@x.com", "employee_type": "Staff"})
+            replica = DB(backend=SQLiteBackend(path, read_only=True), max_connections=2)
+            self.assertEqual([{"email": "e@x.com"}], replica.select("employee", ["email"], {}))
+            with self.assertRaises(Exception):
+                replica.insert("employee", {"email": "f@x.com", "employee_type": "Staff"})
+            writer.pool.close()
+            replica.pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,417 @@
+"""Benchmarks for the HW2 API and DB layer.
+
+	python bench.py micro --output micro.json
+		Times the build_*_query builders, rendering a list response with FastAPI's default
+		JSONResponse and with FastJSONResponse, and execute_query if --with-db is given.
+	python bench.py seed --copies 10
+		Loads people_info.csv into student and employee, optionally many times over.
+
+micro and seed use MySQL, or with --sqlite FILE an embedded SQLite database (created if
+missing), so they can run without any external service. To load test main.py on SQLite,
+seed a file and start main.py with HW2_SQLITE=FILE.
+	python bench.py load --url http://localhost:8002 --concurrency 16 --output load.json
+		Sends a fixed mix of GET requests to a running main.py and reports req/s and latency percentiles.
+	python bench.py compare old.json new.json
+		Compares two result files and exits with status 1 if anything got slower than --threshold.
+
+Results are JSON, so runs of different versions can be kept and compared.
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import pymysql
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backends import HW2_TABLES_SQLITE, SQLiteBackend
+from db import DB, TUPLES
+from responses import FastJSONResponse
+
+# Key-value pairs
+KV = Dict[str, Any]
+
+PEOPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "people_info.csv")
+
+# The requests of the load test; {student_id} and {employee_id} are filled with existing IDs
+LOAD_PATHS = [
+	"/students",
+	"/students?enrollment_year=2021",
+	"/students?enrollment_year=2018&fields=first_name,last_name",
+	"/students?limit=100",
+	"/students/{student_id}",
+	"/employees",
+	"/employees?employee_type=Professor",
+	"/employees/{employee_id}",
+]
+
+# The metric compared across runs for each kind of result, and whether higher is better
+COMPARED_METRICS = {
+	"micro": [("median_us", False)],
+	"load": [("p50_ms", False), ("p99_ms", False), ("requests_per_second", True)],
+}
+
+
+# --- RESULTS ---
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+	"""The q-th percentile (0-100) of sorted_values, by the nearest-rank method."""
+	if not sorted_values:
+		return 0.0
+	rank = max(1, -(-len(sorted_values) * q // 100))
+	return sorted_values[int(rank) - 1]
+
+def run_info(kind: str, params: KV) -> KV:
+	"""Describes the run, so results from different versions and machines can be told apart."""
+	try:
+		revision = subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		revision = None
+	return {
+		"kind": kind,
+		"started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"revision": revision,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"params": params,
+	}
+
+def write_results(results: KV, output: Optional[str]):
+	text = json.dumps(results, indent=2)
+	if output:
+		with open(output, "w") as f:
+			f.write(text + "\n")
+	print(text)
+
+def compare(old: KV, new: KV, threshold: float) -> List[Tuple[str, str, float, float, bool]]:
+	"""Compares the benchmarks two result files have in common.
+
+	:param threshold: Relative change beyond which a benchmark counts as regressed, e.g. 0.1 for 10%
+	:returns: (benchmark, metric, old value, new value, regressed) per compared metric
+	"""
+	if old["kind"] != new["kind"]:
+		raise ValueError(f"can't compare {old['kind']} results with {new['kind']} results")
+	rows = []
+	for name, new_result in new["results"].items():
+		old_result = old["results"].get(name)
+		if old_result is None:
+			continue
+		for metric, higher_is_better in COMPARED_METRICS[new["kind"]]:
+			before, after = old_result[metric], new_result[metric]
+			if higher_is_better:
+				regressed = after < before * (1 - threshold)
+			else:
+				regressed = after > before * (1 + threshold)
+			rows.append((name, metric, before, after, regressed))
+	return rows
+
+
+# --- MICRO-BENCHMARKS ---
+
+def time_call(func: Callable[[], Any], repeat: int) -> KV:
+	"""Times func the way timeit does: repeat rounds of as many calls as take about 0.2s each."""
+	timer = timeit.Timer(func)
+	number, _ = timer.autorange()
+	per_call = sorted(t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number))
+	return {
+		"calls_per_round": number,
+		"min_us": per_call[0],
+		"median_us": statistics.median(per_call),
+	}
+
+def builder_benchmarks() -> Dict[str, Callable[[], Any]]:
+	student = {"first_name": "John", "last_name": "Doe", "email": "jd1@columbia.edu", "enrollment_year": 2021}
+	rows = [dict(student, email=f"jd{i}@columbia.edu") for i in range(1000)]
+	escape = lambda values: pymysql.converters.escape_item(values, "utf8mb4")
+	return {
+		"build_select_query": lambda: DB.build_select_query("student", ["first_name", "email"], {"enrollment_year": 2021}),
+		"build_select_query_keyset": lambda: DB.build_select_query("student", None, {}, ["student_id"], 100, [500]),
+		"build_insert_query": lambda: DB.build_insert_query("student", student),
+		"build_update_query": lambda: DB.build_update_query("student", {"first_name": "Jane"}, {"student_id": 1}),
+		"build_delete_query": lambda: DB.build_delete_query("student", {"student_id": 1}),
+		"build_select_in_query_100": lambda: DB.build_select_in_query("student", ["student_id"], "email", [r["email"] for r in rows[:100]]),
+		"build_update_many_query_100": lambda: DB.build_update_many_query("student", "student_id", [{"student_id": i, "first_name": "Jane"} for i in range(100)]),
+		"build_insert_many_queries_1000": lambda: list(DB.build_insert_many_queries("student", rows, escape, 4 * 1024 * 1024, 1000)),
+	}
+
+def serialization_benchmarks(n_rows: int = 2000) -> Dict[str, Callable[[], Any]]:
+	"""Renders one list response the way FastAPI does by default, and the way main.py does."""
+	rows = [
+		{
+			"student_id": i,
+			"first_name": "John",
+			"last_name": "Doe",
+			"email": f"jd{i}@columbia.edu",
+			"enrollment_year": 2016 + i % 8,
+			"enrolled_on": date(2016 + i % 8, 9, 1),
+			"updated_at": datetime(2024, 2, 1, 12, i % 60),
+			"gpa": Decimal("3.75"),
+			"tot_cred": Decimal(i % 130),
+		}
+		for i in range(n_rows)
+	]
+	return {
+		f"serialize_jsonable_encoder_{n_rows}": lambda: JSONResponse(jsonable_encoder(rows)),
+		f"serialize_fast_json_{n_rows}": lambda: FastJSONResponse(rows),
+	}
+
+def db_benchmarks(db: DB) -> Dict[str, Callable[[], Any]]:
+	query, args = DB.build_select_query("student", None, {"enrollment_year": 2021})
+	by_id, id_args = DB.build_select_query("student", None, {"student_id": 1})
+	return {
+		"execute_query_select_by_id": lambda: db.execute_query(by_id, id_args, True),
+		"execute_query_select_filtered": lambda: db.execute_query(query, args, True),
+		"execute_query_select_filtered_tuples": lambda: db.execute_query(query, args, True, TUPLES),
+		"execute_query_select_all": lambda: db.execute_query("SELECT * FROM student", [], True),
+	}
+
+def micro(args: argparse.Namespace):
+	benchmarks = builder_benchmarks()
+	benchmarks.update(serialization_benchmarks())
+	if args.with_db:
+		db = connect(args)
+		benchmarks.update(db_benchmarks(db))
+	results = run_info("micro", {"repeat": args.repeat, "with_db": args.with_db})
+	results["results"] = {}
+	for name, func in benchmarks.items():
+		if args.only and args.only not in name:
+			continue
+		results["results"][name] = time_call(func, args.repeat)
+		print(f"{name}: {results['results'][name]['median_us']:.2f}us", file=sys.stderr)
+	write_results(results, args.output)
+
+
+# --- SEEDING ---
+
+def read_people(path: str) -> Tuple[List[KV], List[KV]]:
+	"""Reads people_info.csv and splits it into student rows and employee rows.
+
+	People without an employee type are students, as in the HW2 notebook. Empty values become NULL.
+	"""
+	students, employees = [], []
+	with open(path, newline="") as f:
+		for person in csv.DictReader(f):
+			person = {k: v if v != "" else None for k, v in person.items()}
+			if person["employee_type"] is None:
+				del person["employee_type"]
+				students.append(person)
+			else:
+				del person["enrollment_year"]
+				employees.append(person)
+	return students, employees
+
+def copies(rows: List[KV], n: int) -> Iterator[KV]:
+	"""Yields n copies of rows, with the emails of all but the first copy made unique."""
+	for i in range(n):
+		for row in rows:
+			yield row if i == 0 else dict(row, email=f"{i}.{row['email']}")
+
+def seed(args: argparse.Namespace):
+	db = connect(args)
+	students, employees = read_people(args.csv)
+	if args.truncate:
+		for table in ("student", "employee"):
+			db.execute_query(f"DELETE FROM {table}", [], False)
+			db.invalidate(table)
+	for table, rows in (("student", students), ("employee", employees)):
+		start = time.perf_counter()
+		n_rows = sum(db.insert_many(table, list(copies(rows, args.copies))))
+		print(f"{table}: {n_rows} rows in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+# --- LOAD TESTS ---
+
+def fetch_ids(conn: http.client.HTTPConnection, path: str, key: str) -> List:
+	conn.request("GET", f"{path}?fields={key}")
+	response = conn.getresponse()
+	body = response.read()
+	if response.status != 200:
+		raise RuntimeError(f"GET {path} returned {response.status}")
+	return [row[key] for row in json.loads(body)]
+
+def request_paths(ids: Dict[str, List], n: int, seed: int) -> List[str]:
+	"""The paths of n requests, cycling through LOAD_PATHS with IDs picked by a seeded RNG."""
+	rng = random.Random(seed)
+	paths = []
+	for i in range(n):
+		path = LOAD_PATHS[i % len(LOAD_PATHS)]
+		for name, values in ids.items():
+			placeholder = "{" + name + "}"
+			if placeholder in path:
+				path = path.replace(placeholder, str(rng.choice(values) if values else 0))
+		paths.append(path)
+	return paths
+
+def summarize(latencies: List[float], wall_seconds: float, statuses: Dict[int, int], errors: int) -> KV:
+	latencies = sorted(latencies)
+	return {
+		"requests": len(latencies),
+		"errors": errors,
+		"statuses": {str(code): n for code, n in sorted(statuses.items())},
+		"requests_per_second": len(latencies) / wall_seconds if wall_seconds else 0.0,
+		"mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+		"p50_ms": percentile(latencies, 50) * 1000,
+		"p95_ms": percentile(latencies, 95) * 1000,
+		"p99_ms": percentile(latencies, 99) * 1000,
+		"max_ms": latencies[-1] * 1000 if latencies else 0.0,
+	}
+
+def run_load(host: str, port: int, paths: List[str], concurrency: int) -> KV:
+	"""Sends every request in paths over concurrency keep-alive connections.
+
+	:returns: The summary of all requests, and one per route under "routes"
+	"""
+	lock = threading.Lock()
+	next_index = iter(range(len(paths)))
+	# (route, latency, status) per completed request
+	samples: List[Tuple[str, float, int]] = []
+	errors = [0]
+
+	def worker():
+		conn = http.client.HTTPConnection(host, port, timeout=30)
+		while True:
+			with lock:
+				i = next(next_index, None)
+			if i is None:
+				break
+			start = time.perf_counter()
+			try:
+				conn.request("GET", paths[i])
+				response = conn.getresponse()
+				response.read()
+			except (OSError, http.client.HTTPException):
+				conn.close()
+				conn = http.client.HTTPConnection(host, port, timeout=30)
+				with lock:
+					errors[0] += 1
+				continue
+			latency = time.perf_counter() - start
+			with lock:
+				samples.append((LOAD_PATHS[i % len(LOAD_PATHS)], latency, response.status))
+		conn.close()
+
+	threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	wall_seconds = time.perf_counter() - start
+
+	def summary(selected: List[Tuple[str, float, int]], n_errors: int) -> KV:
+		statuses: Dict[int, int] = {}
+		for _, _, code in selected:
+			statuses[code] = statuses.get(code, 0) + 1
+		return summarize([latency for _, latency, _ in selected], wall_seconds, statuses, n_errors)
+
+	results = {"all": summary(samples, errors[0])}
+	for route in LOAD_PATHS:
+		# Errors aren't attributed to routes; requests_per_second is the route's share of the total
+		results[route] = summary([s for s in samples if s[0] == route], 0)
+	return results
+
+def load(args: argparse.Namespace):
+	url = urlsplit(args.url)
+	host, port = url.hostname, url.port or 80
+
+	conn = http.client.HTTPConnection(host, port, timeout=30)
+	ids = {
+		"student_id": fetch_ids(conn, "/students", "student_id"),
+		"employee_id": fetch_ids(conn, "/employees", "employee_id"),
+	}
+	conn.close()
+
+	if args.warmup:
+		run_load(host, port, request_paths(ids, args.warmup, args.seed + 1), args.concurrency)
+	results = run_info("load", {
+		"url": args.url,
+		"concurrency": args.concurrency,
+		"requests": args.requests,
+		"warmup": args.warmup,
+		"seed": args.seed,
+	})
+	results["results"] = run_load(host, port, request_paths(ids, args.requests, args.seed), args.concurrency)
+	write_results(results, args.output)
+
+
+# --- MAIN ---
+
+def connect(args: argparse.Namespace) -> DB:
+	if args.sqlite:
+		return DB(backend=SQLiteBackend(args.sqlite, init_script=HW2_TABLES_SQLITE))
+	return DB(host=args.host, port=args.port, user=args.user, password=args.password, database=args.database)
+
+def compare_files(args: argparse.Namespace):
+	with open(args.old) as f:
+		old = json.load(f)
+	with open(args.new) as f:
+		new = json.load(f)
+	regressions = 0
+	for name, metric, before, after, regressed in compare(old, new, args.threshold):
+		change = (after - before) / before * 100 if before else 0.0
+		print(f"{'REGRESSED ' if regressed else ''}{name} {metric}: {before:.3f} -> {after:.3f} ({change:+.1f}%)")
+		regressions += regressed
+	sys.exit(1 if regressions else 0)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description="Benchmarks for the HW2 API and DB layer.")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	# The same connection settings as main.py
+	db_options = argparse.ArgumentParser(add_help=False)
+	db_options.add_argument("--host", default="localhost")
+	db_options.add_argument("--port", type=int, default=3306)
+	db_options.add_argument("--user", default="root")
+	db_options.add_argument("--password", default="dbuserdbuser")
+	db_options.add_argument("--database", default="s24_hw2")
+	db_options.add_argument("--sqlite", metavar="FILE", help="use an SQLite database file instead of MySQL")
+
+	micro_parser = commands.add_parser("micro", parents=[db_options], help="time the query builders and execute_query")
+	micro_parser.add_argument("--with-db", action="store_true", help="also time execute_query against MySQL")
+	micro_parser.add_argument("--repeat", type=int, default=5, help="timing rounds per benchmark")
+	micro_parser.add_argument("--only", help="run only benchmarks whose name contains this")
+	micro_parser.add_argument("--output", help="file to write the JSON results to")
+	micro_parser.set_defaults(func=micro)
+
+	seed_parser = commands.add_parser("seed", parents=[db_options], help="load people_info.csv into MySQL")
+	seed_parser.add_argument("--csv", default=PEOPLE_CSV)
+	seed_parser.add_argument("--copies", type=int, default=1, help="insert the people this many times")
+	seed_parser.add_argument("--truncate", action="store_true", help="delete existing rows first")
+	seed_parser.set_defaults(func=seed)
+
+	load_parser = commands.add_parser("load", help="load test a running main.py")
+	load_parser.add_argument("--url", default="http://localhost:8002")
+	load_parser.add_argument("--concurrency", type=int, default=16)
+	load_parser.add_argument("--requests", type=int, default=5000)
+	load_parser.add_argument("--warmup", type=int, default=200, help="requests sent before measuring")
+	load_parser.add_argument("--seed", type=int, default=0, help="seed for picking IDs")
+	load_parser.add_argument("--output", help="file to write the JSON results to")
+	load_parser.set_defaults(func=load)
+
+	compare_parser = commands.add_parser("compare", help="compare two result files")
+	compare_parser.add_argument("old")
+	compare_parser.add_argument("new")
+	compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown that counts as a regression")
+	compare_parser.set_defaults(func=compare_files)
+
+	return parser.parse_args(argv)
+
+if __name__ == "__main__":
+	args = parse_args()
+	args.func(args)
@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+from bench import compare, copies, percentile, read_people, request_paths, serialization_benchmarks
+
+
+class BenchTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(1, percentile([1], 99))
+        self.assertEqual(0.0, percentile([], 50))
+
+    def test_compare(self):
+        old = {"kind": "load", "results": {"all": {"p50_ms": 10.0, "p99_ms": 20.0, "requests_per_second": 100.0}}}
+        new = {"kind": "load", "results": {
+            "all": {"p50_ms": 10.5, "p99_ms": 30.0, "requests_per_second": 80.0},
+            "/new": {"p50_ms": 1.0, "p99_ms": 1.0, "requests_per_second": 1.0},
+        }}
+        self.assertEqual([
+            ("all", "p50_ms", 10.0, 10.5, False),
+            ("all", "p99_ms", 20.0, 30.0, True),
+            ("all", "requests_per_second", 100.0, 80.0, True),
+        ], compare(old, new, 0.1))
+        with self.assertRaises(ValueError):
+            compare(old, dict(new, kind="micro"), 0.1)
+
+    def test_read_people(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("first_name,middle_name,last_name,email,employee_type,enrollment_year\n")
+            f.write("Sanders,Arline,Breckell,ab@x.com,Professor,\n")
+            f.write("Zared,,Fenelon,zf@x.com,,2021\n")
+        try:
+            students, employees = read_people(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual([{"first_name": "Zared", "middle_name": None, "last_name": "Fenelon", "email": "zf@x.com", "enrollment_year": "2021"}], students)
+        self.assertEqual([{"first_name": "Sanders", "middle_name": "Arline", "last_name": "Breckell", "email": "ab@x.com", "employee_type": "Professor"}], employees)
+
+    def test_copies_have_unique_emails(self):
+        rows = list(copies([{"email": "a@x.com"}, {"email": "b@x.com"}], 3))
+        self.assertEqual(6, len({row["email"] for row in rows}))
+
+    def test_request_paths_are_reproducible(self):
+        ids = {"student_id": [1, 2, 3], "employee_id": [7]}
+        paths = request_paths(ids, 20, 0)
+        self.assertEqual(paths, request_paths(ids, 20, 0))
+        self.assertIn("/employees/7", paths)
+        self.assertFalse(any("{" in path for path in paths))
+
+
+    def test_serialization_benchmarks_render_the_same_json(self):
+        default, fast = serialization_benchmarks(10).values()
+        self.assertEqual(json.loads(default().body), json.loads(fast().body))
+
+if __name__ == '__main__':
+    unittest.main()
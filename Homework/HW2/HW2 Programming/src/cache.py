@@ -0,0 +1,161 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Key-value pairs
+KV = Dict[str, Any]
+
+
+def estimate_size(rows: List[KV]) -> int:
+	"""Roughly estimates the memory used by a list of rows, in bytes."""
+	size = sys.getsizeof(rows)
+	for row in rows:
+		size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+	return size
+
+
+class ResultCache:
+	"""An in-process LRU cache of select results with a TTL and a memory bound.
+
+	Entries are grouped by table so that a write to a table can drop all of that table's
+	entries. Each table also has a generation number that is bumped on every invalidation;
+	a result is only stored if no write happened while its query was running, so a slow
+	select can't put rows from before a write back into the cache.
+	"""
+
+	def __init__(self, ttl: float = 5.0, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+
+		self._lock = threading.Lock()
+		# key -> (table, expiry time, size, rows); least recently used first
+		self._entries: "OrderedDict[Hashable, Tuple[str, float, int, List[KV]]]" = OrderedDict()
+		self._keys_by_table: Dict[str, Set[Hashable]] = {}
+		self._generations: Dict[str, int] = {}
+		self._bytes = 0
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.invalidations = 0
+
+	def generation(self, table: str) -> int:
+		"""Returns the current generation of table. Pass it to put along with the result."""
+		with self._lock:
+			return self._generations.get(table, 0)
+
+	def get(self, key: Hashable) -> Optional[List[KV]]:
+		"""Returns a copy of the cached rows for key, or None on a miss."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			if entry[1] < time.monotonic():
+				self._remove(key)
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			rows = entry[3]
+		# Callers are free to modify the rows they get back
+		return [dict(row) for row in rows]
+
+	def put(self, table: str, key: Hashable, rows: List[KV], generation: int):
+		"""Caches rows for key, unless table has been written to since generation was read."""
+		size = estimate_size(rows)
+		if size > self.max_bytes:
+			return
+		rows = [dict(row) for row in rows]
+
+		with self._lock:
+			if self._generations.get(table, 0) != generation:
+				return
+			if key in self._entries:
+				self._remove(key)
+			self._entries[key] = (table, time.monotonic() + self.ttl, size, rows)
+			self._keys_by_table.setdefault(table, set()).add(key)
+			self._bytes += size
+
+			while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+				self._remove(next(iter(self._entries)))
+				self.evictions += 1
+
+	def invalidate(self, table: str):
+		"""Drops every cached result for table."""
+		with self._lock:
+			self._generations[table] = self._generations.get(table, 0) + 1
+			for key in self._keys_by_table.pop(table, ()):
+				self._remove(key)
+			self.invalidations += 1
+
+	def clear(self):
+		with self._lock:
+			for table in self._keys_by_table:
+				self._generations[table] = self._generations.get(table, 0) + 1
+			self._entries.clear()
+			self._keys_by_table.clear()
+			self._bytes = 0
+
+	def stats(self) -> KV:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": self.hits / lookups if lookups else 0.0,
+				"evictions": self.evictions,
+				"invalidations": self.invalidations,
+				"entries": len(self._entries),
+				"bytes": self._bytes,
+			}
+
+	def _remove(self, key: Hashable):
+		table, _, size, _ = self._entries.pop(key)
+		self._bytes -= size
+		keys = self._keys_by_table.get(table)
+		if keys is not None:
+			keys.discard(key)
+			if not keys:
+				del self._keys_by_table[table]
+
+
+class TableVersions:
+	"""Per-table version counters, used to build ETags for conditional GETs.
+
+	A table's version is bumped by every write made through DB. Writes made by anyone else
+	go unnoticed, so tags also change every max_age seconds; like the result cache's TTL,
+	that bounds how long a client can keep using a stale copy.
+
+	:param max_age: Seconds a tag stays valid while its tables are unchanged. None means forever.
+	"""
+
+	def __init__(self, max_age: Optional[float] = 5.0):
+		self.max_age = max_age
+		self._lock = threading.Lock()
+		self._versions: Dict[str, int] = {}
+		# Counters start from 0 again after a restart, so tags also carry a per-process token
+		self._epoch = os.urandom(4).hex()
+
+	def version(self, table: str) -> int:
+		with self._lock:
+			return self._versions.get(table, 0)
+
+	def bump(self, table: str):
+		with self._lock:
+			self._versions[table] = self._versions.get(table, 0) + 1
+
+	def etag(self, tables: Iterable[str]) -> str:
+		"""Returns a weak ETag that changes whenever any of tables is written to.
+
+		Read the tag before running the query it describes: a write that lands in between then
+		makes the next request miss, rather than letting a stale response carry a new tag.
+		"""
+		with self._lock:
+			versions = ".".join(str(self._versions.get(table, 0)) for table in tables)
+		window = int(time.time() // self.max_age) if self.max_age else 0
+		return f'W/"{self._epoch}-{window}-{versions}"'
@@ -0,0 +1,87 @@
+import time
+import unittest
+
+from cache import ResultCache, TableVersions
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = ResultCache()
+        self.assertIsNone(cache.get("q"))
+        cache.put("student", "q", [{"ID": 1}], cache.generation("student"))
+        self.assertEqual([{"ID": 1}], cache.get("q"))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(0.5, stats["hit_rate"])
+
+    def test_returned_rows_are_copies(self):
+        cache = ResultCache()
+        cache.put("student", "q", [{"ID": 1}], 0)
+        cache.get("q")[0]["ID"] = 2
+        self.assertEqual([{"ID": 1}], cache.get("q"))
+
+    def test_ttl(self):
+        cache = ResultCache(ttl=0.01)
+        cache.put("student", "q", [], 0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("q"))
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("student", "a", [], 0)
+        cache.put("student", "b", [], 0)
+        cache.get("a")
+        cache.put("student", "c", [], 0)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([], cache.get("a"))
+        self.assertEqual(1, cache.stats()["evictions"])
+
+    def test_memory_bound(self):
+        cache = ResultCache(max_bytes=2000)
+        cache.put("student", "big", [{"name": "x" * 5000}], 0)
+        self.assertIsNone(cache.get("big"))
+        for i in range(20):
+            cache.put("student", i, [{"ID": i}], 0)
+        self.assertLessEqual(cache.stats()["bytes"], 2000)
+
+    def test_invalidation_is_per_table(self):
+        cache = ResultCache()
+        cache.put("student", "s", [{"ID": 1}], 0)
+        cache.put("employee", "e", [{"ID": 1}], 0)
+        cache.invalidate("student")
+        self.assertIsNone(cache.get("s"))
+        self.assertEqual([{"ID": 1}], cache.get("e"))
+
+    def test_write_during_select_is_not_cached(self):
+        cache = ResultCache()
+        generation = cache.generation("student")
+        cache.invalidate("student")
+        cache.put("student", "q", [{"ID": 1}], generation)
+        self.assertIsNone(cache.get("q"))
+
+
+class TableVersionsTest(unittest.TestCase):
+    def test_etag_changes_only_with_its_tables(self):
+        versions = TableVersions(max_age=None)
+        etag = versions.etag(["student"])
+        self.assertTrue(etag.startswith('W/"'))
+        versions.bump("employee")
+        self.assertEqual(etag, versions.etag(["student"]))
+        versions.bump("student")
+        self.assertNotEqual(etag, versions.etag(["student"]))
+        self.assertEqual(1, versions.version("student"))
+
+    def test_etags_differ_between_processes(self):
+        self.assertNotEqual(TableVersions().etag(["student"]), TableVersions().etag(["student"]))
+
+    def test_etag_expires(self):
+        versions = TableVersions(max_age=0.01)
+        etag = versions.etag(["student"])
+        time.sleep(0.02)
+        self.assertNotEqual(etag, versions.etag(["student"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import array
+import itertools
+from typing import Any, Dict, List, Sequence, Tuple
+
+from pymysql.constants import FIELD_TYPE
+
+try:
+	import numpy
+except ImportError:  # NumPy is optional; typed columns fall back to array.array
+	numpy = None
+
+INT_TYPES = {
+	FIELD_TYPE.TINY,
+	FIELD_TYPE.SHORT,
+	FIELD_TYPE.LONG,
+	FIELD_TYPE.LONGLONG,
+	FIELD_TYPE.INT24,
+	FIELD_TYPE.YEAR,
+}
+FLOAT_TYPES = {FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE}
+
+
+def int_column(values: Sequence[int]) -> Sequence[int]:
+	if numpy is not None:
+		return numpy.fromiter(values, dtype=numpy.int64, count=len(values))
+	return array.array("q", values)
+
+
+def float_column(values: Sequence[Any]) -> Sequence[float]:
+	# NULLs become NaN
+	values = [float("nan") if v is None else v for v in values]
+	if numpy is not None:
+		return numpy.fromiter(values, dtype=numpy.float64, count=len(values))
+	return array.array("d", values)
+
+
+def typed_column(type_code: int, values: Sequence[Any]) -> Sequence[Any]:
+	"""Packs the values of one column into an array typed after its MySQL type.
+
+	Integer columns without NULLs become int64 arrays and FLOAT/DOUBLE columns become
+	float64 arrays. Everything else (strings, DECIMAL, dates, integers with NULLs or out
+	of int64 range) stays a list of Python objects.
+	"""
+	try:
+		if type_code in INT_TYPES and None not in values:
+			return int_column(values)
+		if type_code in FLOAT_TYPES:
+			return float_column(values)
+	except OverflowError:
+		pass
+	return list(values)
+
+
+def to_columns(description: Sequence[Tuple], rows: Sequence[Tuple]) -> Dict[str, Sequence[Any]]:
+	"""Turns tuple rows into one typed array per column.
+
+	:param description: The cursor description of the result
+	:param rows: The result rows as tuples
+	:returns: A dict from column name to the values of that column
+	"""
+	values_by_column: List[Sequence[Any]] = list(zip(*rows)) if rows else [() for _ in description]
+	return {
+		column[0]: typed_column(column[1], values)
+		for column, values in zip(description, values_by_column)
+	}
+
+
+def concat_columns(parts: Sequence[Dict[str, Sequence[Any]]]) -> Dict[str, Sequence[Any]]:
+	"""Joins results from to_columns for the same columns into one, keeping typed arrays typed
+	where every part has the same array type.
+	"""
+	if not parts:
+		return {}
+	columns = {}
+	for name in parts[0]:
+		values = [part[name] for part in parts]
+		if numpy is not None and all(isinstance(v, numpy.ndarray) for v in values) and len({v.dtype for v in values}) == 1:
+			columns[name] = numpy.concatenate(values)
+		elif all(isinstance(v, array.array) for v in values) and len({v.typecode for v in values}) == 1:
+			columns[name] = array.array(values[0].typecode, itertools.chain.from_iterable(values))
+		else:
+			# Mixed types, e.g. an integer column with NULLs in only some parts
+			columns[name] = list(itertools.chain.from_iterable(v.tolist() if hasattr(v, "tolist") else v for v in values))
+	return columns
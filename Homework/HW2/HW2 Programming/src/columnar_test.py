@@ -0,0 +1,43 @@
+import math
+import unittest
+
+from pymysql.constants import FIELD_TYPE
+
+from columnar import to_columns
+
+
+class ColumnarTest(unittest.TestCase):
+    def test_to_columns(self):
+        description = [
+            ("ID", FIELD_TYPE.LONG),
+            ("name", FIELD_TYPE.VAR_STRING),
+            ("gpa", FIELD_TYPE.DOUBLE),
+            ("tot_cred", FIELD_TYPE.LONG),
+        ]
+        rows = [
+            (1, "Joe", 3.5, 10),
+            (2, "Mike", None, None),
+        ]
+
+        columns = to_columns(description, rows)
+
+        self.assertEqual(["ID", "name", "gpa", "tot_cred"], list(columns))
+        self.assertEqual([1, 2], list(columns["ID"]))
+        self.assertNotIsInstance(columns["ID"], list)
+        self.assertEqual(["Joe", "Mike"], columns["name"])
+        self.assertEqual(3.5, columns["gpa"][0])
+        self.assertTrue(math.isnan(columns["gpa"][1]))
+        # Integers with NULLs can't be packed into an int64 array
+        self.assertEqual([10, None], columns["tot_cred"])
+
+    def test_empty_result(self):
+        columns = to_columns([("ID", FIELD_TYPE.LONG)], [])
+        self.assertEqual([], list(columns["ID"]))
+
+    def test_out_of_range_integers(self):
+        columns = to_columns([("ID", FIELD_TYPE.LONGLONG)], [(2 ** 64 - 1,)])
+        self.assertEqual([2 ** 64 - 1], columns["ID"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,30 +1,409 @@
-from typing import Any, Dict, List, Tuple, Union
+import asyncio
+import contextvars
+import copy
+import functools
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type, Union
 
 import pymysql
 
+from backends import Backend, MySQLBackend
+from cache import ResultCache, TableVersions
+from columnar import concat_columns, to_columns
+from filters import Condition, chunked, compile_filters, condition_sql, condition_values, in_values, largest_in_filter, padded_size
+from metrics import QueryMetrics
+from pool import ConnectionPool, PoolTimeout
+from schema import SchemaError, TableSchema, parse_schema
+from singleflight import SingleFlight
+
 # Type definitions
 # Key-value pairs
 KV = Dict[str, Any]
 # A Query consists of a string (possibly with placeholders) and a list of values to be put in the placeholders
 Query = Tuple[str, List]
 
-class DB:
-	def __init__(self, host: str, port: int, user: str, password: str, database: str):
-		conn = pymysql.connect(
-			host=host,
-			port=port,
-			user=user,
-			password=password,
-			database=database,
-			cursorclass=pymysql.cursors.DictCursor,
-			autocommit=True,
-		)
+# Result formats of execute_query and select
+# A list of dicts, one per row
+DICTS = "dicts"
+# The column names, and a list of tuples, one per row
+TUPLES = "tuples"
+# A dict from column name to a typed array of that column's values (see columnar.py)
+COLUMNS = "columns"
+RESULT_FORMATS = (DICTS, TUPLES, COLUMNS)
+
+Result = Union[List[KV], Tuple[List[str], List[Tuple]], Dict[str, Sequence]]
+
+# Upper bound on the number of distinct statement shapes cached per builder
+TEMPLATE_CACHE_SIZE = 1024
+
+# The most values sent in one IN list. Longer lists are split across several statements, which
+# keeps each statement small and its placeholder count within what the server accepts.
+MAX_IN_LIST = 1000
+
+
+# The build_*_query methods only differ call to call in their placeholder arguments, so the
+# statement text is memoized on the table, column names and filter conditions that determine it.
+
+def _where_clause(conditions: Tuple[Condition, ...]) -> str:
+	return "WHERE " + " AND ".join(condition_sql(condition) for condition in conditions)
+
+def _keyset_condition(order_by: Tuple[str, ...]) -> str:
+	if len(order_by) == 1:
+		return f"{order_by[0]} > %s"
+	return f"({', '.join(order_by)}) > ({', '.join(['%s'] * len(order_by))})"
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _select_template(
+	table: str,
+	columns: Tuple[str, ...],
+	conditions: Tuple[Condition, ...],
+	order_by: Tuple[str, ...] = (),
+	keyset: bool = False,
+	limit: bool = False,
+) -> str:
+	clauses = [f"SELECT {', '.join(columns)}" if columns else "SELECT *", f"FROM {table}"]
+	where = [condition_sql(condition) for condition in conditions]
+	if keyset:
+		where.append(_keyset_condition(order_by))
+	if where:
+		clauses.append("WHERE " + " AND ".join(where))
+	if order_by:
+		clauses.append(f"ORDER BY {', '.join(order_by)}")
+	if limit:
+		clauses.append("LIMIT %s")
+	return " ".join(clauses)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _insert_template(table: str, columns: Tuple[str, ...]) -> str:
+	placeholders = ", ".join(["%s"] * len(columns))
+	return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _update_template(table: str, columns: Tuple[str, ...], conditions: Tuple[Condition, ...]) -> str:
+	clauses = [f"UPDATE {table}", "SET " + ", ".join(f"{column} = %s" for column in columns)]
+	if conditions:
+		clauses.append(_where_clause(conditions))
+	return " ".join(clauses)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _delete_template(table: str, conditions: Tuple[Condition, ...]) -> str:
+	clauses = [f"DELETE FROM {table}"]
+	if conditions:
+		clauses.append(_where_clause(conditions))
+	return " ".join(clauses)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _insert_many_prefix(table: str, columns: Tuple[str, ...]) -> str:
+	return f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+
+def _placeholders(n: int) -> str:
+	return ", ".join(["%s"] * n)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _select_in_template(table: str, columns: Tuple[str, ...], key: str, n_values: int, for_update: bool) -> str:
+	query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table} WHERE {key} IN ({_placeholders(n_values)})"
+	return query + " FOR UPDATE" if for_update else query
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _update_many_template(table: str, key: str, columns: Tuple[str, ...], n_rows: int) -> str:
+	whens = " ".join(["WHEN %s THEN %s"] * n_rows)
+	set_clause = ", ".join(f"{column} = CASE {key} {whens} ELSE {column} END" for column in columns)
+	return f"UPDATE {table} SET {set_clause} WHERE {key} IN ({_placeholders(n_rows)})"
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _delete_in_template(table: str, key: str, n_values: int) -> str:
+	return f"DELETE FROM {table} WHERE {key} IN ({_placeholders(n_values)})"
+
+def _pad(values: List) -> List:
+	"""Pads values to a power of two by repeating the last one, see filters.padded_size."""
+	return values + values[-1:] * (padded_size(len(values)) - len(values))
+
+_TEMPLATES = {
+	"select": _select_template,
+	"insert": _insert_template,
+	"update": _update_template,
+	"delete": _delete_template,
+	"insert_many": _insert_many_prefix,
+	"select_in": _select_in_template,
+	"update_many": _update_many_template,
+	"delete_in": _delete_in_template,
+}
+
+# Bytes kept free below max_allowed_packet for the packet header and anything the driver adds
+PACKET_HEADROOM = 1024
+
+# Reasons a batch item can be rejected, see BatchError
+NOT_FOUND = "not found"
+CONFLICT = "conflict"
+
+def copy_result(result: Result) -> Result:
+	"""Copies a result deeply enough that the copy can be modified, in any of the result formats."""
+	if isinstance(result, list):
+		return [dict(row) for row in result]
+	if isinstance(result, tuple):
+		names, rows = result
+		return list(names), list(rows)
+	return {name: copy.copy(values) for name, values in result.items()}
+
+class BatchError(Exception):
+	"""Raised when some items of a batch can't be applied. None of the batch is written.
+
+	:ivar errors: Maps the index of each rejected item to NOT_FOUND or CONFLICT and a message
+	"""
+
+	def __init__(self, errors: Dict[int, Tuple[str, str]]):
+		super().__init__(f"{len(errors)} batch item(s) rejected")
+		self.errors = errors
+
+# Tables written during the current request (or other read_your_writes block). Reads of them
+# go to the primary rather than a replica that may not have the writes yet.
+_written_tables: contextvars.ContextVar[Optional[Set[str]]] = contextvars.ContextVar("written_tables", default=None)
+
+class Transaction:
+	"""Statements run on one connection and committed (or rolled back) together. See DB.transaction.
+
+	:ivar tables: Tables written to in the transaction
+	"""
+
+	def __init__(self, db: "DB", conn: Any):
+		self.db = db
 		self.conn = conn
+		self.tables: Set[str] = set()
+		self.finished = False
+		self._savepoints = 0
+
+	def savepoint(self) -> str:
+		"""Starts a nested transaction and returns its name."""
+		self._savepoints += 1
+		name = f"sp{self._savepoints}"
+		self._execute(f"SAVEPOINT {name}")
+		return name
+
+	def release(self, name: str):
+		"""Keeps the changes made since savepoint name as part of the enclosing transaction."""
+		self._execute(f"RELEASE SAVEPOINT {name}")
+
+	def rollback_to(self, name: str):
+		"""Undoes the changes made since savepoint name, and ends it."""
+		self._execute(f"ROLLBACK TO SAVEPOINT {name}")
+		self._execute(f"RELEASE SAVEPOINT {name}")
+
+	def commit(self):
+		self._finish(self.conn.commit)
+
+	def rollback(self):
+		self._finish(self.conn.rollback)
+
+	def _execute(self, statement: str):
+		cur = self.conn.cursor()
+		try:
+			cur.execute(statement)
+		finally:
+			cur.close()
+
+	def _finish(self, end: Callable[[], None]):
+		if self.finished:
+			raise RuntimeError("transaction already finished")
+		self.finished = True
+		broken = False
+		try:
+			end()
+		except BaseException as e:
+			broken = isinstance(e, self.db.pool.broken_errors)
+			raise
+		finally:
+			self.db.pool.release(self.conn, broken)
+			# Other connections may have cached or versioned the tables while they still had
+			# the old rows, so invalidate them again now that the outcome is visible
+			for table in self.tables:
+				self.db.invalidate(table)
+
+class DB:
+	def __init__(
+		self,
+		host: Optional[str] = None,
+		port: int = 3306,
+		user: Optional[str] = None,
+		password: Optional[str] = None,
+		database: Optional[str] = None,
+		min_connections: int = 1,
+		max_connections: int = 10,
+		pool_timeout: float = 10.0,
+		max_idle: float = 300.0,
+		result_cache: Optional[ResultCache] = None,
+		metrics: Optional[QueryMetrics] = None,
+		versions: Optional[TableVersions] = None,
+		backend: Optional[Backend] = None,
+		replicas: Sequence[Backend] = (),
+		replica_lag: float = 1.0,
+		replica_timeout: float = 0.0,
+		replica_backoff: float = 5.0,
+	):
+		"""Creates a DB backed by a pool of connections.
+
+		Connects to MySQL at host and port, unless another backend is given.
+
+		If replicas are given, selects are spread over them and everything else goes to the
+		primary. A table's reads also go to the primary for replica_lag seconds after each write
+		to it, and for the rest of a read_your_writes block that wrote to it.
+
+		:param min_connections: Connections opened up front and kept open while idle
+		:param max_connections: Upper bound on concurrently open connections
+		:param pool_timeout: Seconds to wait for a free connection before raising PoolTimeout
+		:param max_idle: Seconds after which idle connections above min_connections are closed
+		:param result_cache: If given, select results are cached here and invalidated by writes
+		:param metrics: Where query statistics are recorded. Defaults to a new QueryMetrics.
+		:param versions: Per-table version counters bumped by writes. Defaults to a new TableVersions.
+		:param backend: The database to use instead of MySQL, e.g. a backends.SQLiteBackend
+		:param replicas: Read replicas of the database. Each gets a pool with the same max_connections.
+		:param replica_lag: Upper bound on how far the replicas lag behind the primary, in seconds
+		:param replica_timeout: Seconds a read waits for a free replica connection before going to
+			the primary instead. By default it doesn't wait.
+		:param replica_backoff: Seconds a replica that failed to connect is left alone before it
+			is tried again. Reads go to the other replicas or the primary meanwhile.
+		"""
+		if backend is None:
+			if database is None:
+				raise ValueError("either the MySQL connection parameters or a backend must be given")
+			backend = MySQLBackend(host, port, user, password, database)
 
-	def get_cursor(self):
-		return self.conn.cursor()
+		self.backend = backend
+		self.max_allowed_packet: Optional[int] = None
+		# Filled in by load_schema
+		self.schema: Dict[str, TableSchema] = {}
+		self.result_cache = result_cache
+		self.metrics = metrics if metrics is not None else QueryMetrics()
+		self.versions = versions if versions is not None else TableVersions()
+		# Identical selects running at the same time share one execution
+		self.flights = SingleFlight()
+		# The transaction statements on the current thread run in, see transaction
+		self._local = threading.local()
 
-	def execute_query(self, query: str, args: List, ret_result: bool) -> Union[List[KV], int]:
+		def make_pool(backend: Backend, min_size: int) -> ConnectionPool:
+			max_size = max_connections
+			if backend.max_connections is not None:
+				max_size = min(max_size, backend.max_connections)
+			return ConnectionPool(
+				backend.connect,
+				min_size=min(min_size, max_size),
+				max_size=max_size,
+				timeout=pool_timeout,
+				max_idle=max_idle,
+				broken_errors=backend.broken_connection_errors,
+			)
+
+		self.pool = make_pool(backend, min_connections)
+		# Replicas connect on first use, so one that is down doesn't stop DB from starting
+		self.replica_pools = [make_pool(replica, 0) for replica in replicas]
+		self.replica_lag = replica_lag
+		self.replica_timeout = replica_timeout
+		self.replica_backoff = replica_backoff
+		# When each replica may be tried again after failing to connect, by time.monotonic()
+		self._replica_down_until = [0.0] * len(self.replica_pools)
+		# When each table was last written to, by time.monotonic()
+		self._last_write: Dict[str, float] = {}
+		self._next_replica = itertools.count()
+
+	@contextmanager
+	def get_cursor(
+		self,
+		cursor_class: Optional[Type[pymysql.cursors.Cursor]] = None,
+		read_table: Optional[str] = None,
+	) -> Iterator[pymysql.cursors.Cursor]:
+		"""Borrows a connection from the pool and yields a cursor on it.
+
+		The connection goes back to the pool when the with block exits.
+
+		Inside transaction(), the cursor is opened on the transaction's connection instead.
+
+		:param cursor_class: The pymysql cursor class to use. Defaults to the connection's DictCursor.
+		:param read_table: If given, the cursor is only used to read this table, so it may be on a replica
+		"""
+		with self._connection(read_table) as conn:
+			cur = conn.cursor(cursor_class)
+			try:
+				yield cur
+			finally:
+				cur.close()
+
+	@contextmanager
+	def _connection(self, read_table: Optional[str] = None) -> Iterator[Any]:
+		tx = self.current_transaction()
+		if tx is not None:
+			yield tx.conn
+			return
+
+		replica = self._next_replica_up() if read_table is not None and not self.needs_primary(read_table) else None
+		if replica is not None:
+			pool = self.replica_pools[replica]
+			try:
+				conn = pool.acquire(self.replica_timeout)
+			except PoolTimeout:
+				# A saturated replica shouldn't hold up the read; the primary can serve it
+				pass
+			except Exception:
+				# Neither should one that is down, and it isn't dialed again until the backoff is over
+				self._replica_down_until[replica] = time.monotonic() + self.replica_backoff
+			else:
+				try:
+					yield conn
+				except BaseException as e:
+					pool.release(conn, broken=isinstance(e, pool.broken_errors))
+					raise
+				pool.release(conn)
+				return
+
+		with self.pool.connection() as conn:
+			yield conn
+
+	def _next_replica_up(self) -> Optional[int]:
+		"""The index of the next replica in turn that isn't marked down, or None if all are."""
+		now = time.monotonic()
+		start = next(self._next_replica)
+		for i in range(len(self.replica_pools)):
+			replica = (start + i) % len(self.replica_pools)
+			if self._replica_down_until[replica] <= now:
+				return replica
+		return None
+
+	def needs_primary(self, table: str) -> bool:
+		"""Whether reads of table must go to the primary, because there are no replicas or they may
+		not have caught up with a recent write to it.
+		"""
+		if not self.replica_pools:
+			return True
+		written = _written_tables.get()
+		if written is not None and table in written:
+			return True
+		last_write = self._last_write.get(table)
+		return last_write is not None and time.monotonic() - last_write < self.replica_lag
+
+	@staticmethod
+	@contextmanager
+	def read_your_writes() -> Iterator[None]:
+		"""Sends reads of any table written to inside the with block to the primary until it exits.
+
+		Wrap each request in one, so a request that writes and then reads sees its own writes.
+		AsyncDB carries the block over to its worker threads.
+		"""
+		token = _written_tables.set(set())
+		try:
+			yield
+		finally:
+			_written_tables.reset(token)
+
+	def execute_query(
+		self,
+		query: str,
+		args: List,
+		ret_result: bool,
+		result_format: str = DICTS,
+		read_table: Optional[str] = None,
+	) -> Union[Result, int]:
 		"""Executes a query.
 
 		:param query: A query string, possibly containing %s placeholders
@@ -33,99 +412,452 @@ class DB:
 							row from the table. If False, the number of rows affected is returned. Note
 							that the length of the list of dicts is not necessarily equal to the number
 							of rows affected.
-		:returns: a list of dicts or a number, depending on ret_result
+		:param result_format: The shape of the returned rows, one of RESULT_FORMATS. TUPLES and COLUMNS
+							avoid building a dict per row.
+		:param read_table: If given, the query only reads this table, so it may run on a replica.
+		:returns: a list of dicts (or rows in result_format) or a number, depending on ret_result
 		"""
-		cur = self.get_cursor()
-		count = cur.execute(query, args=args)
-		if ret_result:
-			return cur.fetchall()
-		else:
-			return count
+		if result_format not in RESULT_FORMATS:
+			raise ValueError(f"result_format must be one of {RESULT_FORMATS}, got {result_format!r}")
+
+		start = time.perf_counter()
+		try:
+			result, count = self._execute(query, args, ret_result, result_format, read_table)
+		except Exception:
+			self.metrics.observe(query, time.perf_counter() - start, error=True)
+			raise
+		self.metrics.observe(query, time.perf_counter() - start, count)
+		return result
+
+	def _execute(
+		self, query: str, args: List, ret_result: bool, result_format: str, read_table: Optional[str],
+	) -> Tuple[Union[Result, int], int]:
+		cursor_class = None if result_format == DICTS else pymysql.cursors.Cursor
+		with self.get_cursor(cursor_class, read_table) as cur:
+			count = cur.execute(query, args=args)
+			if not ret_result:
+				return count, count
+
+			rows = cur.fetchall()
+			if result_format == DICTS:
+				return rows, count
+			description = cur.description or ()
+			if result_format == TUPLES:
+				return ([column[0] for column in description], list(rows)), count
+			return to_columns(description, rows), count
+
+
+	def _execute_on(self, cur: pymysql.cursors.Cursor, statement: str, query: str, args: Optional[List] = None) -> int:
+		"""Executes query on an already borrowed cursor and records it in metrics under statement."""
+		start = time.perf_counter()
+		try:
+			count = cur.execute(query, args=args)
+		except Exception:
+			self.metrics.observe(statement, time.perf_counter() - start, error=True)
+			raise
+		self.metrics.observe(statement, time.perf_counter() - start, count)
+		return count
+
+	def current_transaction(self) -> Optional[Transaction]:
+		"""The transaction statements on this thread run in, or None if they autocommit."""
+		return getattr(self._local, "transaction", None)
+
+	@contextmanager
+	def transaction(self) -> Iterator[Transaction]:
+		"""Runs the statements made through DB on this thread in the with block in one transaction.
+
+		The transaction is committed once when the block exits and rolled back if it raises, so a
+		group of writes costs one commit instead of one per statement. Nested transaction() blocks
+		become savepoints: an exception rolls back only the inner block's changes, and the outer
+		block may catch it and carry on.
+
+			with db.transaction():
+				db.insert('student', {...})
+				db.update('employee', {...}, {...})
+
+		Selects inside a transaction see its uncommitted changes, so they bypass the result cache.
+		The transaction holds one connection, so don't use it from several threads at once; with
+		MySQL, don't run other statements while iterating over iter_select_chunks either.
+		"""
+		tx = self.current_transaction()
+		if tx is not None:
+			name = tx.savepoint()
+			try:
+				yield tx
+			except BaseException:
+				tx.rollback_to(name)
+				raise
+			tx.release(name)
+			return
 
+		tx = self.begin()
+		try:
+			with self.bind(tx):
+				yield tx
+		except BaseException:
+			tx.rollback()
+			raise
+		tx.commit()
+
+	def begin(self) -> Transaction:
+		"""Starts a transaction on a connection of its own. Most callers want transaction() instead.
+
+		Statements only run in it inside bind(tx), and it must be ended with commit or rollback,
+		which return the connection to the pool.
+		"""
+		conn = self.pool.acquire()
+		try:
+			conn.begin()
+		except BaseException as e:
+			self.pool.release(conn, broken=isinstance(e, self.pool.broken_errors))
+			raise
+		return Transaction(self, conn)
+
+	@contextmanager
+	def bind(self, tx: Optional[Transaction]) -> Iterator[None]:
+		"""Makes statements on this thread run in tx for the duration of the with block."""
+		previous = self.current_transaction()
+		self._local.transaction = tx
+		try:
+			yield
+		finally:
+			self._local.transaction = previous
+
+	def _max_statement_bytes(self, cur: pymysql.cursors.Cursor) -> int:
+		if self.max_allowed_packet is None:
+			self.max_allowed_packet = self.backend.max_allowed_packet(cur)
+		return self.max_allowed_packet - PACKET_HEADROOM
+
+	def close(self):
+		"""Closes the connection pools of the primary and the replicas."""
+		self.pool.close()
+		for pool in self.replica_pools:
+			pool.close()
+
+	@staticmethod
+	def template_cache_stats() -> Dict[str, KV]:
+		"""Reports hit/miss counters of the statement template cache, per builder."""
+		stats = {}
+		for name, template in _TEMPLATES.items():
+			info = template.cache_info()
+			stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+		return stats
+
+	@staticmethod
+	def clear_template_cache():
+		for template in _TEMPLATES.values():
+			template.cache_clear()
+
+	def load_schema(self) -> Dict[str, TableSchema]:
+		"""Reads the tables of the database from INFORMATION_SCHEMA (or the backend's equivalent)
+		and keeps them in self.schema.
+
+		From then on, statements that name an unknown table or column, or give an integer column
+		a non-integer value, raise SchemaError instead of being sent to the database.
+
+		:returns: The schema of each table, by name
+		"""
+		column_rows, index_rows = self.backend.schema_rows(lambda query, args: self.execute_query(query, args, True))
+		self.schema = parse_schema(column_rows, index_rows)
+		return self.schema
+
+	def check(
+		self,
+		table: str,
+		names: Iterable[str] = (),
+		values: Optional[KV] = None,
+		filters: Optional[KV] = None,
+	) -> Tuple[Tuple[Condition, ...], List]:
+		"""Checks table, column names and values against the schema. Does nothing until load_schema is
+		called, except that repeated names and malformed filters are always rejected.
+
+		:param table: The table the statement is for
+		:param names: Column names the statement refers to
+		:param values: Key-value pairs the statement writes
+		:param filters: Filters the statement selects rows by. See build_select_query.
+		:returns: The filters compiled by compile_filters, so callers don't parse them again
+		:raises SchemaError: If the table or a column is unknown or repeated in names, or a value
+			doesn't fit its column
+		:raises ValueError: If the value of an "in" or "isnull" filter is malformed
+		"""
+		names = list(names)
+		if len(set(names)) != len(names):
+			# Each repetition would be a statement shape of its own
+			raise SchemaError(f"repeated column(s) in {', '.join(names)}")
+		# A malformed filter fails here rather than in the database
+		conditions, args = compile_filters(filters)
+		if not self.schema:
+			return conditions, args
+		table_schema = self.schema.get(table)
+		if table_schema is None:
+			raise SchemaError(f"unknown table {table}")
+		table_schema.check_names(names)
+		if values:
+			table_schema.check_values(values)
+		for name, value in condition_values(conditions, args):
+			table_schema.check_value(name, value)
+		return conditions, args
+
+	def invalidate(self, table: str):
+		"""Bumps the version of table and drops its cached select results.
+
+		Writes through DB call this automatically. Inside a transaction, it is called again when
+		the transaction ends.
+		"""
+		tx = self.current_transaction()
+		if tx is not None:
+			tx.tables.add(table)
+		written = _written_tables.get()
+		if written is not None:
+			written.add(table)
+		self._last_write[table] = time.monotonic()
+		self.versions.bump(table)
+		if self.result_cache is not None:
+			self.result_cache.invalidate(table)
 
 	# TODO: all methods below
 
 
 	@staticmethod
-	def build_select_query(table: str, columns: List[str], filters: KV) -> Query:
+	def build_select_query(
+		table: str,
+		columns: List[str],
+		filters: KV,
+		order_by: Optional[List[str]] = None,
+		limit: Optional[int] = None,
+		after: Optional[List] = None,
+	) -> Query:
 		"""Builds a query that selects rows. See db_test for examples.
 
+		Pages are fetched with keyset pagination: `after` holds the order_by values of the last
+		row of the previous page, and only rows sorting after it are selected. Unlike OFFSET,
+		this lets an index on the order_by columns skip straight to the start of the page.
+
+		Each filter key is a column, optionally followed by "__" and an operator:
+		eq (the default), ne, lt, lte, gt and gte compare the column to the value;
+		in takes a list or a comma-separated string of values; startswith takes a prefix;
+		isnull takes true or false. For example {"enrollment_year__gte": 2020} selects rows
+		WHERE enrollment_year >= %s. Each compiles to a condition an index on the column can serve.
+
 		:param table: The table to be selected from
 		:param columns: The attributes to select. If empty, then selects all columns.
-		:param filters: Key-value pairs that the rows from table must satisfy
+		:param filters: Filters that the rows from table must satisfy
+		:param order_by: Attributes to sort the rows by, in ascending order
+		:param limit: The maximum number of rows to select
+		:param after: The order_by values of the row to start after. Requires order_by.
 		:returns: A query string and any placeholder arguments
+		:raises ValueError: If the value of an "in" or "isnull" filter is malformed
 		"""
+		conditions, args = compile_filters(filters)
+		return DB._build_select(table, columns, conditions, args, order_by, limit, after)
 
-		# Start building the SELECT part of the query
-		if rows:
-			select_clause = f"SELECT {', '.join(rows)}"
-		else:
-			select_clause = "SELECT *"
-
-		# Add the FROM part of the query
-		from_clause = f"FROM {table}"
-
-		# Initialize an empty list for arguments
-		args = []
-
-		# Build the WHERE part of the query if there are any filters
-		if filters:
-			where_clauses = []
-			for key, value in filters.items():
-				# Assume all filters use equality for simplicity
-				where_clauses.append(f"{key} = %s")
-				args.append(value)
-			where_clause = "WHERE " + " AND ".join(where_clauses)
-		else:
-			where_clause = ""
-
-		# Combine all parts of the query
-		query = f"{select_clause} {from_clause} {where_clause}"
+	@staticmethod
+	def _build_select(
+		table: str,
+		columns: List[str],
+		conditions: Tuple[Condition, ...],
+		args: List,
+		order_by: Optional[List[str]],
+		limit: Optional[int],
+		after: Optional[List],
+	) -> Query:
+		"""build_select_query for filters already compiled by compile_filters. Extends args."""
+		order_by = tuple(order_by or ())
+		if after is not None and len(after) != len(order_by):
+			raise ValueError(f"after must have one value per order_by column {order_by}, got {after}")
+		if limit is not None and (not isinstance(limit, int) or limit < 1):
+			raise ValueError(f"limit must be a positive integer, got {limit!r}")
 
-		if query[-1] == " ":
-			query = query[:-1]
+		query = _select_template(
+			table,
+			tuple(columns or ()),
+			conditions,
+			order_by,
+			after is not None,
+			limit is not None,
+		)
+		if after is not None:
+			args.extend(after)
+		if limit is not None:
+			args.append(limit)
 		return query, args
 
 
 
-	def select(self, table: str, columns: List[str], filters: KV) -> List[KV]:
+	def select(
+		self,
+		table: str,
+		columns: List[str],
+		filters: KV,
+		order_by: Optional[List[str]] = None,
+		limit: Optional[int] = None,
+		after: Optional[List] = None,
+		result_format: str = DICTS,
+	) -> Result:
 		"""Runs a select statement. You should use build_select_query and execute_query.
 
 		:param table: The table to be selected from
 		:param columns: The attributes to select. If empty, then selects all columns.
 		:param filters: Key-value pairs that the rows to be selected must satisfy
+		:param order_by: Attributes to sort the rows by, in ascending order
+		:param limit: The maximum number of rows to select
+		:param after: The order_by values of the row to start after. See build_select_query.
+		:param result_format: The shape of the returned rows. See execute_query.
 		:returns: The selected rows
+
+		Concurrent calls for the same rows share one query. A call made after a write to table
+		returns never shares a query started before it.
+
+		An "in" filter with more than MAX_IN_LIST values is split into one query per MAX_IN_LIST
+		values, and their results are merged (and sorted and limited, for DICTS and TUPLES).
 		"""
-		query, args = self.build_select_query(table, rows, filters)
-		rows = self.execute_query(query, args, True)
-		return rows
+		selected = list(columns or ())
+		conditions, args = self.check(table, selected + [c for c in order_by or () if c not in selected], filters=filters)
+		parts = self._split_in_filter(filters, conditions)
+		if len(parts) > 1:
+			return self._select_parts(table, columns, parts, order_by, limit, after, result_format)
+
+		query, args = self._build_select(table, columns, conditions, args, order_by, limit, after)
+		if self.current_transaction() is not None:
+			# The result may include the transaction's uncommitted changes, so it can't be shared
+			return self.execute_query(query, args, True, result_format)
+
+		key = (query, tuple(args))
+		# Only lists of dicts are cached
+		cached = self.result_cache is not None and result_format == DICTS
+		if cached:
+			rows = self.result_cache.get(key)
+			if rows is not None:
+				return rows
+
+		def run() -> Result:
+			if not cached:
+				return self.execute_query(query, args, True, result_format, table)
+			generation = self.result_cache.generation(table)
+			rows = self.execute_query(query, args, True, read_table=table)
+			self.result_cache.put(table, key, rows, generation)
+			return rows
+
+		# Callers that must see recent writes can't share a query sent to a replica
+		flight = (key, result_format, self.versions.version(table), self.needs_primary(table))
+		return self.flights.do(flight, run, copy_result)
 
 	@staticmethod
-	def build_insert_query(table: str, values: KV) -> Query:
-		"""Builds a query that inserts a row. See db_test for examples.
+	def _split_in_filter(filters: KV, conditions: Tuple[Condition, ...]) -> List[KV]:
+		"""Splits filters into several with the same conditions, if needed so that no "in" filter
+		has more than MAX_IN_LIST values. Together they match the same rows, each row once.
 
-		:param table: The table to be inserted into
-		:param values: Key-value pairs that represent the values to be inserted
-		:returns: A query string and any placeholder arguments
+		:param conditions: The compiled filters, which rule out a split without another parse
 		"""
-		insert_clause = f"INSERT INTO {table} "
+		# The padded size is at least the number of values
+		if not any(operator == "in" and size > MAX_IN_LIST for _, operator, size in conditions):
+			return [filters]
+		key, size = largest_in_filter(filters)
+		if size <= MAX_IN_LIST:
+			return [filters]
+		# A value repeated across parts would match its rows in both
+		values = list(dict.fromkeys(in_values(filters[key])))
+		return [{**filters, key: list(part)} for part in chunked(values, MAX_IN_LIST)]
 
-		args = []
+	def _select_parts(
+		self,
+		table: str,
+		columns: List[str],
+		parts: List[KV],
+		order_by: Optional[List[str]],
+		limit: Optional[int],
+		after: Optional[List],
+		result_format: str,
+	) -> Result:
+		"""Runs select once per filters in parts and merges the results into one."""
+		order_by = list(order_by or ())
+		if result_format == COLUMNS:
+			if order_by or limit is not None:
+				raise ValueError("order_by and limit aren't supported for COLUMNS results with a split in filter")
+			return concat_columns([self.select(table, columns, part, result_format=COLUMNS) for part in parts])
+
+		# The order_by columns are needed to sort the merged rows; they're dropped again afterwards
+		extra = [column for column in order_by if columns and column not in columns]
+		selected = list(columns or ()) + extra
+		names: List[str] = []
+		rows: List[Tuple] = []
+		for part in parts:
+			names, part_rows = self.select(table, selected, part, order_by, limit, after, TUPLES)
+			rows.extend(part_rows)
 
-		keys = "("
-		vals = "("
+		if order_by:
+			positions = [names.index(column) for column in order_by]
+			# NULLs sort first, as in MySQL
+			rows.sort(key=lambda row: tuple((row[i] is not None, row[i]) for i in positions))
+		if limit is not None:
+			rows = rows[:limit]
+		if extra:
+			kept = len(names) - len(extra)
+			names, rows = names[:kept], [row[:kept] for row in rows]
+		if result_format == TUPLES:
+			return names, rows
+		return [dict(zip(names, row)) for row in rows]
 
-		for k, v in values.items():
-			args.append(v)
-			keys += k + ", "
-			vals += "%s, "
+	def iter_select_chunks(self, table: str, columns: List[str], filters: KV, chunk_size: int = 1000) -> Iterator[List[KV]]:
+		"""Runs a select statement and yields the selected rows in chunks of up to chunk_size.
 
-		keys = keys[:-2] + ")"
-		vals = vals[:-2] + ")"
+		Uses an unbuffered server-side cursor, so only one chunk is held in memory at a time.
+		The connection stays checked out until the iterator is exhausted or closed.
+
+		:param table: The table to be selected from
+		:param columns: The attributes to select. If empty, then selects all columns.
+		:param filters: Filters that the rows to be selected must satisfy. See build_select_query.
+		:param chunk_size: The number of rows fetched from the server at a time
+		:returns: An iterator over lists of rows
+		"""
+		conditions, args = self.check(table, columns or (), filters=filters)
+		parts = self._split_in_filter(filters, conditions)
+		if len(parts) > 1:
+			for part in parts:
+				yield from self.iter_select_chunks(table, columns, part, chunk_size)
+			return
 
-		insert_clause += keys + " VALUES " + vals
+		query, args = self._build_select(table, columns, conditions, args, None, None, None)
+		# Only time spent waiting on the server counts, not time the consumer spends per chunk
+		elapsed = 0.0
+		n_rows = 0
+		error = False
+		try:
+			with self.get_cursor(pymysql.cursors.SSDictCursor, table) as cur:
+				start = time.perf_counter()
+				cur.execute(query, args=args)
+				while True:
+					chunk = cur.fetchmany(chunk_size)
+					elapsed += time.perf_counter() - start
+					if not chunk:
+						return
+					n_rows += len(chunk)
+					yield chunk
+					start = time.perf_counter()
+		except Exception:
+			error = True
+			raise
+		finally:
+			self.metrics.observe(query, elapsed, n_rows, error)
 
-		return insert_clause, args
+	def iter_select(self, table: str, columns: List[str], filters: KV, chunk_size: int = 1000) -> Iterator[KV]:
+		"""Like select, but yields rows one at a time instead of returning them all at once.
+
+		See iter_select_chunks.
+		"""
+		for chunk in self.iter_select_chunks(table, columns, filters, chunk_size):
+			yield from chunk
+
+	@staticmethod
+	def build_insert_query(table: str, values: KV) -> Query:
+		"""Builds a query that inserts a row. See db_test for examples.
+
+		:param table: The table to be inserted into
+		:param values: Key-value pairs that represent the values to be inserted
+		:returns: A query string and any placeholder arguments
+		"""
+		query = _insert_template(table, tuple(values))
+		return query, list(values.values())
 
 
 
@@ -136,37 +868,100 @@ class DB:
 		:param values: Key-value pairs that represent the values to be inserted
 		:returns: The number of rows affected
 		"""
+		self.check(table, values=values)
 		query, args = self.build_insert_query(table, values)
-		n_rows = self.execute_query(query, args, False)
+		try:
+			n_rows = self.execute_query(query, args, False)
+		finally:
+			self.invalidate(table)
 
 		return n_rows
 
+	@staticmethod
+	def build_insert_many_queries(
+		table: str,
+		rows: List[KV],
+		escape: Callable[[Tuple], str],
+		max_bytes: int,
+		max_rows: int,
+	) -> Iterator[str]:
+		"""Builds multi-row INSERT statements, each at most max_bytes long and max_rows rows.
+
+		The values are inlined (escaped by `escape`) rather than passed as placeholder arguments,
+		so that the length of each statement is known while the batch is being built.
+
+		:param table: The table to be inserted into
+		:param rows: Key-value pairs for each row. Every row must have the same keys.
+		:param escape: Turns a tuple of values into an SQL literal such as "(1,'Joe')"
+		:param max_bytes: The maximum length of a statement, in bytes
+		:param max_rows: The maximum number of rows in a statement
+		:returns: An iterator over the statements
+		"""
+		if not rows:
+			return
+		columns = tuple(rows[0])
+		prefix = _insert_many_prefix(table, columns)
+		batch: List[str] = []
+		size = len(prefix)
+
+		for row in rows:
+			if len(row) != len(columns) or any(column not in row for column in columns):
+				raise ValueError(f"every row must have the columns {columns}, got {tuple(row)}")
+			literal = escape(tuple(row[column] for column in columns))
+			# +1 for the comma separating it from the previous row
+			literal_size = len(literal.encode()) + 1
+			if len(prefix) + literal_size > max_bytes:
+				raise ValueError(f"row of {literal_size} bytes does not fit in a {max_bytes} byte statement")
+
+			if batch and (size + literal_size > max_bytes or len(batch) == max_rows):
+				yield prefix + ",".join(batch)
+				batch, size = [], len(prefix)
+			batch.append(literal)
+			size += literal_size
+
+		yield prefix + ",".join(batch)
+
+	def insert_many(self, table: str, rows: List[KV], batch_size: int = 1000) -> List[int]:
+		"""Inserts many rows using multi-row INSERT statements.
+
+		Rows are grouped into statements of at most batch_size rows that stay under the server's
+		max_allowed_packet. Each statement is its own round trip and, outside transaction(), its
+		own transaction, so a failure part way through leaves the earlier batches inserted.
+
+		:param table: The table to be inserted into
+		:param rows: Key-value pairs for each row. Every row must have the same keys.
+		:param batch_size: The maximum number of rows per statement
+		:returns: The number of rows affected by each statement
+		"""
+		for row in rows:
+			self.check(table, values=row)
+		with self.get_cursor() as cur:
+			try:
+				return self._insert_many_on(cur, table, rows, batch_size)
+			finally:
+				self.invalidate(table)
+
+	def _insert_many_on(self, cur: pymysql.cursors.Cursor, table: str, rows: List[KV], batch_size: int) -> List[int]:
+		queries = self.build_insert_many_queries(
+			table, rows, cur.connection.escape, self._max_statement_bytes(cur), batch_size,
+		)
+		# Values are inlined, so the statement text is not a useful shape; use its prefix
+		statement = _insert_many_prefix(table, tuple(rows[0])) + "(...)" if rows else ""
+		# No args, so pymysql sends the already-escaped statements as is
+		return [self._execute_on(cur, statement, query) for query in queries]
+
 	@staticmethod
 	def build_update_query(table: str, values: KV, filters: KV) -> Query:
 		"""Builds a query that updates rows. See db_test for examples.
 
 		:param table: The table to be updated
 		:param values: Key-value pairs that represent the new values
-		:param filters: Key-value pairs that the rows from table must satisfy
+		:param filters: Filters that the rows from table must satisfy. See build_select_query.
 		:returns: A query string and any placeholder arguments
 		"""
-		clauses = [f"UPDATE {table}"]
-		args = []
-
-		set_clauses = []
-		for key, value in values.items():
-			set_clauses.append(f"{key} = %s")
-			args.append(value)
-		clauses.append("SET " + ", ".join(set_clauses))
-
-		if filters:
-			where_clauses = []
-			for key, value in filters.items():
-				where_clauses.append(f"{key} = %s")
-				args.append(value)
-			clauses.append("WHERE " + " AND ".join(where_clauses))
-
-		return " ".join(clauses), args
+		conditions, filter_args = compile_filters(filters)
+		query = _update_template(table, tuple(values), conditions)
+		return query, list(values.values()) + filter_args
 
 
 
@@ -175,11 +970,23 @@ class DB:
 
 		:param table: The table to be updated
 		:param values: Key-value pairs that represent the new values
-		:param filters: Key-value pairs that the rows to be updated must satisfy
+		:param filters: Filters that the rows to be updated must satisfy. See build_select_query.
 		:returns: The number of rows affected
 		"""
-		query, args = self.build_update_query(table, values, filters)
-		n_rows = self.execute_query(query, args, False)
+		conditions, filter_args = self.check(table, values=values, filters=filters)
+		parts = self._split_in_filter(filters, conditions)
+		if len(parts) > 1:
+			queries = [self.build_update_query(table, values, part) for part in parts]
+		else:
+			queries = [(_update_template(table, tuple(values), conditions), list(values.values()) + filter_args)]
+		try:
+			# A split in filter takes several statements, which must all apply or none
+			with self.transaction() if len(queries) > 1 else nullcontext():
+				n_rows = 0
+				for query, args in queries:
+					n_rows += self.execute_query(query, args, False)
+		finally:
+			self.invalidate(table)
 		return n_rows
 
 
@@ -189,20 +996,11 @@ class DB:
 		"""Builds a query that deletes rows. See db_test for examples.
 
 		:param table: The table to be deleted from
-		:param filters: Key-value pairs that the rows to be deleted must satisfy
+		:param filters: Filters that the rows to be deleted must satisfy. See build_select_query.
 		:returns: A query string and any placeholder arguments
 		"""
-		args = []
-		clauses = [f"DELETE FROM {table}"]
-
-		if filters:
-			where_clauses = []
-			for key, value in filters.items():
-				where_clauses.append(f"{key} = %s")
-				args.append(value)
-			clauses.append("WHERE " + " AND ".join(where_clauses))
-
-		return " ".join(clauses), args
+		conditions, args = compile_filters(filters)
+		return _delete_template(table, conditions), args
 
 
 
@@ -211,9 +1009,360 @@ class DB:
 		"""Runs a delete statement. You should use build_delete_query and execute_query.
 
 		:param table: The table to be deleted from
-		:param filters: Key-value pairs that the rows to be deleted must satisfy
+		:param filters: Filters that the rows to be deleted must satisfy. See build_select_query.
 		:returns: The number of rows affected
 		"""
-		query, args = self.build_delete_query(table, filters)
-		n_rows = self.execute_query(query, args, False)
+		conditions, filter_args = self.check(table, filters=filters)
+		parts = self._split_in_filter(filters, conditions)
+		if len(parts) > 1:
+			queries = [self.build_delete_query(table, part) for part in parts]
+		else:
+			queries = [(_delete_template(table, conditions), filter_args)]
+		try:
+			# A split in filter takes several statements, which must all apply or none
+			with self.transaction() if len(queries) > 1 else nullcontext():
+				n_rows = 0
+				for query, args in queries:
+					n_rows += self.execute_query(query, args, False)
+		finally:
+			self.invalidate(table)
 		return n_rows
+
+
+	@staticmethod
+	def build_select_in_query(table: str, columns: List[str], key: str, values: List, for_update: bool = False) -> Query:
+		"""Builds a query that selects the rows whose key is one of values.
+
+		:param table: The table to be selected from
+		:param columns: The attributes to select. If empty, then selects all columns.
+		:param key: The attribute to match against values
+		:param values: The values to look for
+		:param for_update: If True, locks the selected rows until the end of the transaction
+		:returns: A query string and any placeholder arguments
+
+		Like the "in" filters of build_select_query, values is padded to a power of two.
+		"""
+		args = _pad(list(values))
+		return _select_in_template(table, tuple(columns or ()), key, len(args), for_update), args
+
+	@staticmethod
+	def build_update_many_query(table: str, key: str, rows: List[KV]) -> Query:
+		"""Builds a query that updates several rows, each to its own values, in one statement.
+
+		:param table: The table to be updated
+		:param key: The attribute identifying each row. Every row must include it.
+		:param rows: Key-value pairs for each row. Every row must have the same keys.
+		:returns: A query string and any placeholder arguments
+		"""
+		columns = tuple(column for column in rows[0] if column != key)
+		# Repeating the last row changes nothing, and keeps the number of shapes small
+		rows = _pad(list(rows))
+		args = []
+		for column in columns:
+			for row in rows:
+				args.append(row[key])
+				args.append(row[column])
+		args.extend(row[key] for row in rows)
+		return _update_many_template(table, key, columns, len(rows)), args
+
+	@staticmethod
+	def build_delete_in_query(table: str, key: str, values: List) -> Query:
+		"""Builds a query that deletes the rows whose key is one of values.
+
+		:param table: The table to be deleted from
+		:param key: The attribute to match against values
+		:param values: The values of the rows to delete
+		:returns: A query string and any placeholder arguments
+		"""
+		args = _pad(list(values))
+		return _delete_in_template(table, key, len(args)), args
+
+	def _find_conflicts(
+		self,
+		cur: pymysql.cursors.Cursor,
+		table: str,
+		key: Optional[str],
+		rows: List[KV],
+		unique: List[str],
+		errors: Dict[int, Tuple[str, str]],
+	):
+		"""Adds a CONFLICT to errors for every row whose value of a unique column is already
+		taken, either by another row of the batch or by a different row of table.
+		"""
+		for column in unique:
+			first_index: Dict[Any, int] = {}
+			for i, row in enumerate(rows):
+				value = row.get(column)
+				if value is None:
+					continue
+				if value in first_index:
+					errors.setdefault(i, (CONFLICT, f"{column} {value!r} is repeated in the batch"))
+				else:
+					first_index[value] = i
+			if not first_index:
+				continue
+
+			existing_rows = []
+			for part in chunked(list(first_index), MAX_IN_LIST):
+				query, args = self.build_select_in_query(
+					table, [column] + ([key] if key else []), column, part, self.backend.select_for_update,
+				)
+				self._execute_on(cur, query, query, args)
+				existing_rows.extend(cur.fetchall())
+			# The column's collation may match values that aren't equal in Python, e.g. by case
+			folded_index = {str(value).casefold(): i for value, i in first_index.items()}
+			for existing in existing_rows:
+				i = first_index.get(existing[column], folded_index.get(str(existing[column]).casefold()))
+				if i is None:
+					continue
+				if key is None or existing[key] != rows[i][key]:
+					errors.setdefault(i, (CONFLICT, f"{column} {existing[column]!r} already exists"))
+
+	def _find_missing(
+		self,
+		cur: pymysql.cursors.Cursor,
+		table: str,
+		key: str,
+		keys: List,
+		errors: Dict[int, Tuple[str, str]],
+	):
+		"""Adds a NOT_FOUND to errors for every key that isn't in table, and locks the rows that are."""
+		found = set()
+		for part in chunked(list(set(keys)), MAX_IN_LIST):
+			query, args = self.build_select_in_query(table, [key], key, part, self.backend.select_for_update)
+			self._execute_on(cur, query, query, args)
+			found.update(row[key] for row in cur.fetchall())
+		for i, value in enumerate(keys):
+			if value not in found:
+				errors.setdefault(i, (NOT_FOUND, f"{key} {value!r} does not exist"))
+
+	def insert_batch(self, table: str, rows: List[KV], unique: List[str] = ()) -> int:
+		"""Inserts rows in one transaction, or none of them.
+
+		Rows that set the same columns are inserted together by multi-row INSERT statements.
+
+		:param table: The table to be inserted into
+		:param rows: Key-value pairs for each row
+		:param unique: Columns whose values must not already be taken
+		:returns: The number of rows inserted
+		:raises BatchError: If a row would violate uniqueness. Nothing is inserted.
+		"""
+		for row in rows:
+			self.check(table, values=row)
+		try:
+			with self.transaction(), self.get_cursor() as cur:
+				errors: Dict[int, Tuple[str, str]] = {}
+				self._find_conflicts(cur, table, None, rows, list(unique), errors)
+				if errors:
+					raise BatchError(errors)
+
+				groups: Dict[Tuple[str, ...], List[KV]] = {}
+				for row in rows:
+					groups.setdefault(tuple(sorted(row)), []).append(row)
+				return sum(
+					sum(self._insert_many_on(cur, table, group, len(group)))
+					for group in groups.values()
+				)
+		finally:
+			self.invalidate(table)
+
+	def update_batch(self, table: str, key: str, rows: List[KV], unique: List[str] = ()) -> int:
+		"""Updates rows, each identified by its key, in one transaction, or none of them.
+
+		Rows that set the same columns are updated together by one statement.
+
+		:param table: The table to be updated
+		:param key: The attribute identifying each row. Every row must include it.
+		:param rows: Key-value pairs for each row: its key and its new values
+		:param unique: Columns whose new values must not be taken by other rows
+		:returns: The number of rows matched
+		:raises BatchError: If a row doesn't exist or would violate uniqueness. Nothing is updated.
+		"""
+		for row in rows:
+			self.check(table, values=row)
+		try:
+			with self.transaction(), self.get_cursor() as cur:
+				errors: Dict[int, Tuple[str, str]] = {}
+				keys = [row[key] for row in rows]
+				seen = set()
+				for i, value in enumerate(keys):
+					if value in seen:
+						errors[i] = (CONFLICT, f"{key} {value!r} is repeated in the batch")
+					seen.add(value)
+				self._find_missing(cur, table, key, keys, errors)
+				self._find_conflicts(cur, table, key, rows, list(unique), errors)
+				if errors:
+					raise BatchError(errors)
+
+				groups: Dict[Tuple[str, ...], List[KV]] = {}
+				for row in rows:
+					# A row with nothing but its key has nothing to update
+					if len(row) > 1:
+						groups.setdefault(tuple(sorted(row)), []).append(row)
+
+				n_rows = 0
+				for group in groups.values():
+					query, args = self.build_update_many_query(table, key, group)
+					n_rows += self._execute_on(cur, query, query, args)
+				return n_rows
+		finally:
+			self.invalidate(table)
+
+	def delete_batch(self, table: str, key: str, keys: List) -> int:
+		"""Deletes the rows with the given keys in one transaction, or none of them.
+
+		:param table: The table to be deleted from
+		:param key: The attribute identifying each row
+		:param keys: The key of every row to delete
+		:returns: The number of rows deleted
+		:raises BatchError: If a key doesn't exist. Nothing is deleted.
+		"""
+		self.check(table, [key])
+		try:
+			with self.transaction(), self.get_cursor() as cur:
+				errors: Dict[int, Tuple[str, str]] = {}
+				self._find_missing(cur, table, key, keys, errors)
+				if errors:
+					raise BatchError(errors)
+				n_rows = 0
+				for part in chunked(list(set(keys)), MAX_IN_LIST):
+					query, args = self.build_delete_in_query(table, key, part)
+					n_rows += self._execute_on(cur, query, query, args)
+				return n_rows
+		finally:
+			self.invalidate(table)
+
+
+class AsyncDB:
+	"""An awaitable wrapper around DB for use from async request handlers.
+
+	pymysql is blocking, so every call is handed off to a dedicated thread pool instead of
+	running on the event loop. The thread pool is sized to the connection pools by default,
+	since extra threads would only wait for a connection.
+	"""
+
+	def __init__(self, db: DB, max_workers: Optional[int] = None):
+		self.db = db
+		self.executor = ThreadPoolExecutor(
+			max_workers=max_workers or db.pool.max_size + sum(pool.max_size for pool in db.replica_pools),
+			thread_name_prefix="db",
+		)
+
+	async def run(self, func: Callable, *args) -> Any:
+		"""Runs func(*args) on the DB thread pool and waits for the result.
+
+		func sees the caller's context variables, e.g. its DB.read_your_writes block.
+		"""
+		loop = asyncio.get_running_loop()
+		context = contextvars.copy_context()
+		return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+	async def execute_query(
+		self, query: str, args: List, ret_result: bool, result_format: str = DICTS, read_table: Optional[str] = None,
+	) -> Union[Result, int]:
+		return await self.run(self.db.execute_query, query, args, ret_result, result_format, read_table)
+
+	async def select(
+		self,
+		table: str,
+		columns: List[str],
+		filters: KV,
+		order_by: Optional[List[str]] = None,
+		limit: Optional[int] = None,
+		after: Optional[List] = None,
+		result_format: str = DICTS,
+	) -> Result:
+		return await self.run(self.db.select, table, columns, filters, order_by, limit, after, result_format)
+
+	async def iter_select_chunks(
+		self, table: str, columns: List[str], filters: KV, chunk_size: int = 1000,
+	) -> AsyncIterator[List[KV]]:
+		"""Async version of DB.iter_select_chunks. Each chunk is fetched on the DB thread pool."""
+		chunks = self.db.iter_select_chunks(table, columns, filters, chunk_size)
+		try:
+			while True:
+				chunk = await self.run(next, chunks, None)
+				if chunk is None:
+					return
+				yield chunk
+		finally:
+			# Drains the server-side cursor and returns the connection to the pool
+			await self.run(chunks.close)
+
+	async def insert(self, table: str, values: KV) -> int:
+		return await self.run(self.db.insert, table, values)
+
+	async def insert_many(self, table: str, rows: List[KV], batch_size: int = 1000) -> List[int]:
+		return await self.run(self.db.insert_many, table, rows, batch_size)
+
+	async def insert_batch(self, table: str, rows: List[KV], unique: List[str] = ()) -> int:
+		return await self.run(self.db.insert_batch, table, rows, unique)
+
+	async def update_batch(self, table: str, key: str, rows: List[KV], unique: List[str] = ()) -> int:
+		return await self.run(self.db.update_batch, table, key, rows, unique)
+
+	async def delete_batch(self, table: str, key: str, keys: List) -> int:
+		return await self.run(self.db.delete_batch, table, key, keys)
+
+	async def update(self, table: str, values: KV, filters: KV) -> int:
+		return await self.run(self.db.update, table, values, filters)
+
+	async def delete(self, table: str, filters: KV) -> int:
+		return await self.run(self.db.delete, table, filters)
+
+	@asynccontextmanager
+	async def transaction(self) -> AsyncIterator["AsyncTransaction"]:
+		"""Async version of DB.transaction. Statements run in the transaction only through the
+		AsyncTransaction it yields, which has the same methods as AsyncDB:
+
+			async with db.transaction() as tx:
+				await tx.insert('student', {...})
+				await tx.update('employee', {...}, {...})
+		"""
+		tx = await self.run(self.db.begin)
+		try:
+			yield AsyncTransaction(self, tx)
+		except BaseException:
+			await self.run(tx.rollback)
+			raise
+		await self.run(tx.commit)
+
+	def close(self):
+		"""Waits for in-flight calls to finish, then closes the connection pools."""
+		self.executor.shutdown(wait=True)
+		self.db.close()
+
+
+class AsyncTransaction(AsyncDB):
+	"""An AsyncDB whose calls all run in one transaction. See AsyncDB.transaction.
+
+	Calls are run one at a time, since they share a connection. transaction() starts a savepoint.
+	"""
+
+	def __init__(self, async_db: AsyncDB, tx: Transaction):
+		self.db = async_db.db
+		self.executor = async_db.executor
+		self.tx = tx
+		self._lock = asyncio.Lock()
+
+	async def run(self, func: Callable, *args) -> Any:
+		async with self._lock:
+			return await super().run(self._run_bound, func, *args)
+
+	def _run_bound(self, func: Callable, *args) -> Any:
+		# Each call may land on a different thread of the pool, so bind the transaction per call
+		with self.db.bind(self.tx):
+			return func(*args)
+
+	@asynccontextmanager
+	async def transaction(self) -> AsyncIterator["AsyncTransaction"]:
+		name = await self.run(self.tx.savepoint)
+		try:
+			yield self
+		except BaseException:
+			await self.run(self.tx.rollback_to, name)
+			raise
+		await self.run(self.tx.release, name)
+
+	def close(self):
+		raise RuntimeError("close the AsyncDB, not its transaction")
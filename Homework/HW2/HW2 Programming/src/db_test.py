@@ -1,6 +1,18 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import types
 import unittest
+from unittest import mock
 
-from db import DB
+import pymysql
+
+from backends import HW2_TABLES_SQLITE, SQLiteBackend
+from cache import ResultCache
+from db import COLUMNS, TUPLES, AsyncDB, DB
 
 class DBTest(unittest.TestCase):
     def run_test_table(self, func, tests):
@@ -32,6 +44,51 @@ class DBTest(unittest.TestCase):
 
         self.run_test_table(DB.build_select_query, tests)
 
+    def test_build_select_query_pagination(self):
+        tests = [
+            (
+                ("student", [], {}, ["ID"], 10),
+                ("SELECT * FROM student ORDER BY ID LIMIT %s", [10])
+            ),
+            (
+                ("student", ["name"], {"dept_name": "CS"}, ["ID"], 10, [42]),
+                ("SELECT name FROM student WHERE dept_name = %s AND ID > %s ORDER BY ID LIMIT %s", ["CS", 42, 10])
+            ),
+            (
+                ("student", [], {}, ["dept_name", "ID"], None, ["CS", 42]),
+                ("SELECT * FROM student WHERE (dept_name, ID) > (%s, %s) ORDER BY dept_name, ID", ["CS", 42])
+            ),
+        ]
+
+        self.run_test_table(DB.build_select_query, tests)
+
+        with self.assertRaises(ValueError):
+            DB.build_select_query("student", [], {}, ["ID"], None, [1, 2])
+        with self.assertRaises(ValueError):
+            DB.build_select_query("student", [], {}, ["ID"], 0)
+
+    def test_build_select_query_operators(self):
+        tests = [
+            (
+                ("student", [], {"enrollment_year__gte": 2020, "enrollment_year__lt": 2024}),
+                ("SELECT * FROM student WHERE enrollment_year >= %s AND enrollment_year < %s", [2020, 2024])
+            ),
+            (
+                ("employee", ["email"], {"employee_type__in": "Professor,Lecturer,Staff"}),
+                ("SELECT email FROM employee WHERE employee_type IN (%s, %s, %s, %s)", ["Professor", "Lecturer", "Staff", "Staff"])
+            ),
+            (
+                ("student", [], {"last_name__startswith": "Mc", "email__isnull": "false"}),
+                ("SELECT * FROM student WHERE last_name LIKE %s ESCAPE '!' AND email IS NOT NULL", ["Mc%"])
+            ),
+        ]
+
+        self.run_test_table(DB.build_select_query, tests)
+        self.assertEqual(
+            ("DELETE FROM student WHERE student_id IN (%s, %s)", [1, 2]),
+            DB.build_delete_query("student", {"student_id__in": [1, 2]}),
+        )
+
     def test_build_insert_query(self):
         tests = [
             (
@@ -50,6 +107,39 @@ class DBTest(unittest.TestCase):
 
         self.run_test_table(DB.build_insert_query, tests)
 
+    def test_build_insert_many_queries(self):
+        def escape(row):
+            return pymysql.converters.escape_item(row, "utf8mb4")
+
+        rows = [{"ID": i, "name": f"n{i}"} for i in range(5)]
+        prefix = "INSERT INTO student (ID, name) VALUES "
+        tests = [
+            (
+                ("student", rows[:2], escape, 1000, 1000),
+                [prefix + "(0,'n0'),(1,'n1')"]
+            ),
+            (
+                ("student", rows, escape, 1000, 2),
+                [prefix + "(0,'n0'),(1,'n1')", prefix + "(2,'n2'),(3,'n3')", prefix + "(4,'n4')"]
+            ),
+            (
+                # Each row literal is 8 bytes plus a separator, so only three fit after the prefix
+                ("student", rows, escape, len(prefix) + 27, 1000),
+                [prefix + "(0,'n0'),(1,'n1'),(2,'n2')", prefix + "(3,'n3'),(4,'n4')"]
+            ),
+            (
+                ("student", [], escape, 1000, 1000),
+                []
+            ),
+        ]
+
+        self.run_test_table(lambda *args: list(DB.build_insert_many_queries(*args)), tests)
+
+        with self.assertRaises(ValueError):
+            list(DB.build_insert_many_queries("student", [{"ID": 1}, {"name": "Joe"}], escape, 1000, 1000))
+        with self.assertRaises(ValueError):
+            list(DB.build_insert_many_queries("student", [{"name": "x" * 100}], escape, 50, 1000))
+
     def test_build_update_query(self):
         tests = [
             (
@@ -89,5 +179,330 @@ class DBTest(unittest.TestCase):
 
         self.run_test_table(DB.build_delete_query, tests)
 
+    def test_build_select_in_query(self):
+        tests = [
+            (
+                ("student", [], "ID", [1, 2]),
+                ("SELECT * FROM student WHERE ID IN (%s, %s)", [1, 2])
+            ),
+            (
+                ("student", ["ID", "email"], "email", ["a@b.edu"], True),
+                ("SELECT ID, email FROM student WHERE email IN (%s) FOR UPDATE", ["a@b.edu"])
+            ),
+        ]
+
+        self.run_test_table(DB.build_select_in_query, tests)
+        # Lists are padded to a power of two, so there are few distinct statements
+        self.assertEqual(
+            ("SELECT ID FROM student WHERE ID IN (%s, %s, %s, %s)", [1, 2, 3, 3]),
+            DB.build_select_in_query("student", ["ID"], "ID", [1, 2, 3]),
+        )
+
+    def test_build_update_many_query(self):
+        tests = [
+            (
+                ("student", "ID", [{"ID": 1, "name": "Joe"}, {"ID": 2, "name": "Mike"}]),
+                (
+                    "UPDATE student SET name = CASE ID WHEN %s THEN %s WHEN %s THEN %s ELSE name END WHERE ID IN (%s, %s)",
+                    [1, "Joe", 2, "Mike", 1, 2]
+                )
+            ),
+            (
+                ("student", "ID", [{"ID": 1, "name": "Joe", "dept_name": "CS"}]),
+                (
+                    "UPDATE student SET name = CASE ID WHEN %s THEN %s ELSE name END, "
+                    "dept_name = CASE ID WHEN %s THEN %s ELSE dept_name END WHERE ID IN (%s)",
+                    [1, "Joe", 1, "CS", 1]
+                )
+            ),
+        ]
+
+        self.run_test_table(DB.build_update_many_query, tests)
+        query, args = DB.build_update_many_query("student", "ID", [{"ID": i, "name": str(i)} for i in range(3)])
+        self.assertTrue(query.endswith("WHERE ID IN (%s, %s, %s, %s)"))
+        self.assertEqual([0, "0", 1, "1", 2, "2", 2, "2", 0, 1, 2, 2], args)
+
+    def test_build_delete_in_query(self):
+        tests = [
+            (
+                ("student", "ID", [1, 2, 3]),
+                ("DELETE FROM student WHERE ID IN (%s, %s, %s, %s)", [1, 2, 3, 3])
+            ),
+        ]
+
+        self.run_test_table(DB.build_delete_in_query, tests)
+
+    def test_template_cache(self):
+        DB.clear_template_cache()
+        DB.build_select_query("student", [], {"ID": 1})
+        query, args = DB.build_select_query("student", [], {"ID": 2})
+        DB.build_select_query("student", [], {"name": "Joe"})
+
+        self.assertEqual(("SELECT * FROM student WHERE ID = %s", [2]), (query, args))
+        stats = DB.template_cache_stats()["select"]
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertEqual(2, stats["size"])
+
+
+class AsyncDBTest(unittest.TestCase):
+    def test_calls_run_off_the_event_loop(self):
+        threads = []
+
+        def select(table, columns, filters, *args):
+            threads.append(threading.current_thread())
+            return [{"table": table, **filters}]
+
+        fake_db = types.SimpleNamespace(pool=types.SimpleNamespace(max_size=2), replica_pools=[], close=lambda: None, select=select)
+        async_db = AsyncDB(fake_db)
+
+        async def run():
+            return await asyncio.gather(*(async_db.select("student", [], {"ID": i}) for i in range(4)))
+
+        results = asyncio.run(run())
+        async_db.close()
+
+        self.assertEqual([[{"table": "student", "ID": i}] for i in range(4)], results)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_iter_select_chunks_closes_source(self):
+        closed = []
+
+        def iter_select_chunks(table, columns, filters, chunk_size):
+            try:
+                for i in range(3):
+                    yield [{"ID": i}]
+            finally:
+                closed.append(True)
+
+        fake_db = types.SimpleNamespace(
+            pool=types.SimpleNamespace(max_size=1),
+            replica_pools=[],
+            close=lambda: None,
+            iter_select_chunks=iter_select_chunks,
+        )
+        async_db = AsyncDB(fake_db)
+
+        async def first_chunk():
+            chunks = async_db.iter_select_chunks("student", [], {})
+            async for chunk in chunks:
+                await chunks.aclose()
+                return chunk
+
+        self.assertEqual([{"ID": 0}], asyncio.run(first_chunk()))
+        async_db.close()
+        self.assertEqual([True], closed)
+
+class FilterTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DB(backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE), result_cache=ResultCache())
+        rows = [
+            {"last_name": name, "middle_name": "M" if i % 3 else None, "email": f"{i}@x.com", "enrollment_year": 2016 + i}
+            for i, name in enumerate(["McAdams", "Mcb_x", "Mc%", "Smith", "Mcintyre", "Adams"])
+        ]
+        self.db.insert_many("student", rows)
+        self.db.load_schema()
+
+    def tearDown(self):
+        self.db.close()
+
+    def ids(self, filters, **kwargs):
+        return [row["student_id"] for row in self.db.select("student", ["student_id"], filters, ["student_id"], **kwargs)]
+
+    def test_operators(self):
+        self.assertEqual([4, 5, 6], self.ids({"enrollment_year__gte": "2019"}))
+        self.assertEqual([1, 6], self.ids({"student_id__in": "6,1,99"}))
+        self.assertEqual([], self.ids({"student_id__in": ""}))
+        # Wildcards in the prefix match only themselves
+        self.assertEqual([1, 2, 3, 5], self.ids({"last_name__startswith": "Mc"}))
+        self.assertEqual([2], self.ids({"last_name__startswith": "Mcb_"}))
+        self.assertEqual([3], self.ids({"last_name__startswith": "Mc%"}))
+        self.assertEqual([1, 4], self.ids({"middle_name__isnull": "true"}))
+        self.assertEqual([2, 3, 5], self.ids({"middle_name__isnull": "false", "last_name__startswith": "Mc", "student_id__ne": 6}))
+
+    def test_invalid_filters(self):
+        with self.assertRaises(ValueError):
+            self.ids({"student_id__in": "1,x"})
+        with self.assertRaises(ValueError):
+            self.ids({"nickname__startswith": "M"})
+        with self.assertRaises(ValueError):
+            self.ids({"middle_name__isnull": "maybe"})
+        with self.assertRaises(ValueError):
+            self.db.select("student", ["email", "email"], {})
+
+    def test_large_in_lists_are_split(self):
+        with mock.patch("db.MAX_IN_LIST", 2):
+            ids = [6, 1, 5, 1, 3, 99]
+            self.assertEqual([1, 3, 5, 6], self.ids({"student_id__in": ids}))
+            self.assertEqual([1, 3], self.ids({"student_id__in": ids}, limit=2))
+            # The order_by column is selected to sort by, then dropped
+            rows = self.db.select("student", ["last_name"], {"student_id__in": ids}, ["enrollment_year"], 3)
+            self.assertEqual([{"last_name": "McAdams"}, {"last_name": "Mc%"}, {"last_name": "Mcintyre"}], rows)
+            names, rows = self.db.select("student", ["student_id"], {"student_id__in": ids}, result_format=TUPLES)
+            self.assertEqual([1, 3, 5, 6], sorted(row[0] for row in rows))
+            self.assertEqual([1, 3, 5, 6], sorted(self.db.select("student", ["student_id"], {"student_id__in": ids}, result_format=COLUMNS)["student_id"]))
+            self.assertEqual(4, sum(len(chunk) for chunk in self.db.iter_select_chunks("student", ["student_id"], {"student_id__in": ids})))
+            self.assertEqual(4, self.db.update("student", {"first_name": "X"}, {"student_id__in": ids}))
+            self.assertEqual(4, self.db.delete("student", {"student_id__in": ids}))
+        self.assertEqual([2, 4], self.ids({}))
+
+
+class TransactionTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DB(backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE), result_cache=ResultCache())
+
+    def tearDown(self):
+        self.db.pool.close()
+
+    def emails(self):
+        return [row["email"] for row in self.db.select("student", ["email"], {}, ["student_id"])]
+
+    def test_commit(self):
+        with self.db.transaction():
+            self.db.insert("student", {"email": "a@x.com"})
+            self.db.insert("student", {"email": "b@x.com"})
+            # Reads in the transaction see its changes
+            self.assertEqual(["a@x.com", "b@x.com"], self.emails())
+        self.assertEqual(["a@x.com", "b@x.com"], self.emails())
+        self.assertIsNone(self.db.current_transaction())
+
+    def test_rollback(self):
+        self.db.insert("student", {"email": "a@x.com"})
+        self.assertEqual(["a@x.com"], self.emails())
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.delete("student", {})
+                self.assertEqual([], self.emails())
+                raise RuntimeError
+        # The cached result from before the transaction is gone, and the delete undone
+        self.assertEqual(["a@x.com"], self.emails())
+        self.assertEqual(1, self.db.pool.idle)
+
+    def test_nested_transaction_is_a_savepoint(self):
+        with self.db.transaction():
+            self.db.insert("student", {"email": "a@x.com"})
+            with self.assertRaises(RuntimeError):
+                with self.db.transaction():
+                    self.db.insert("student", {"email": "b@x.com"})
+                    raise RuntimeError
+            with self.db.transaction():
+                self.db.insert("student", {"email": "c@x.com"})
+        self.assertEqual(["a@x.com", "c@x.com"], self.emails())
+
+    def test_async_transaction(self):
+        async_db = AsyncDB(self.db)
+
+        async def run():
+            async with async_db.transaction() as tx:
+                await tx.insert("student", {"email": "a@x.com"})
+                with self.assertRaises(KeyError):
+                    async with tx.transaction():
+                        await tx.insert("student", {"email": "b@x.com"})
+                        raise KeyError
+                self.assertEqual(1, len(await tx.select("student", None, {})))
+            with self.assertRaises(RuntimeError):
+                async with async_db.transaction() as tx:
+                    await tx.delete("student", {})
+                    raise RuntimeError
+
+        asyncio.run(run())
+        async_db.executor.shutdown()
+        self.assertEqual(["a@x.com"], self.emails())
+
+class ReplicaTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary = os.path.join(directory.name, "primary.db")
+        replica = os.path.join(directory.name, "replica.db")
+        # A replica that never catches up, so it's visible where each read went
+        DB(backend=SQLiteBackend(replica, init_script=HW2_TABLES_SQLITE)).close()
+        self.db = DB(
+            backend=SQLiteBackend(primary, init_script=HW2_TABLES_SQLITE),
+            replicas=[SQLiteBackend(replica, read_only=True)],
+            replica_lag=0.05,
+        )
+        self.addCleanup(self.db.close)
+
+    def count(self, table):
+        return len(self.db.select(table, None, {}))
+
+    def test_reads_go_to_replica_except_right_after_a_write(self):
+        self.db.insert("student", {"email": "a@x.com"})
+        self.assertEqual(1, self.count("student"))
+        time.sleep(0.06)
+        self.assertEqual(0, self.count("student"))
+        self.assertEqual(1, self.db.execute_query("SELECT * FROM student", [], True).__len__())
+
+    def test_read_your_writes(self):
+        self.db.replica_lag = 0
+        with DB.read_your_writes():
+            self.assertEqual(0, self.count("student"))
+            self.db.insert("student", {"email": "a@x.com"})
+            self.assertEqual(1, self.count("student"))
+            self.assertEqual(1, sum(len(chunk) for chunk in self.db.iter_select_chunks("student", None, {})))
+        self.assertEqual(0, self.count("student"))
+
+    def test_read_your_writes_in_async_calls(self):
+        self.db.replica_lag = 0
+        async_db = AsyncDB(self.db)
+
+        async def run():
+            with DB.read_your_writes():
+                await async_db.insert("student", {"email": "a@x.com"})
+                return len(await async_db.select("student", None, {}))
+
+        self.assertEqual(1, asyncio.run(run()))
+        async_db.executor.shutdown()
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        db = DB(
+            backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE),
+            replicas=[SQLiteBackend("/nonexistent/replica.db", read_only=True)],
+        )
+        db.insert("student", {"email": "a@x.com"})
+        db.replica_lag = 0
+        self.assertEqual(1, len(db.select("student", None, {})))
+        db.close()
+
+    def test_saturated_replica_falls_back_without_waiting(self):
+        db = DB(
+            backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE),
+            replicas=[self.db.backend],
+            max_connections=1,
+            pool_timeout=5.0,
+        )
+        self.addCleanup(db.close)
+        db.insert("student", {"email": "a@x.com"})
+        db.replica_lag = 0
+        conn = db.replica_pools[0].acquire()
+        start = time.monotonic()
+        self.assertEqual(1, len(db.select("student", None, {})))
+        self.assertLess(time.monotonic() - start, 1.0)
+        db.replica_pools[0].release(conn)
+
+    def test_failing_replica_is_left_alone_for_the_backoff(self):
+        attempts = []
+
+        class DownBackend(SQLiteBackend):
+            def connect(self):
+                attempts.append(time.monotonic())
+                raise sqlite3.OperationalError("unable to open database file")
+
+        db = DB(
+            backend=SQLiteBackend(":memory:", init_script=HW2_TABLES_SQLITE),
+            replicas=[DownBackend(":memory:")],
+            replica_backoff=0.05,
+        )
+        self.addCleanup(db.close)
+        db.insert("student", {"email": "a@x.com"})
+        db.replica_lag = 0
+        for _ in range(3):
+            self.assertEqual(1, len(db.select("student", None, {})))
+        self.assertEqual(1, len(attempts))
+        time.sleep(0.06)
+        self.assertEqual(1, len(db.select("student", None, {})))
+        self.assertEqual(2, len(attempts))
+
 if __name__ == '__main__':
     unittest.main()
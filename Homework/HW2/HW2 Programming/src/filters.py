@@ -0,0 +1,185 @@
+import functools
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Key-value pairs
+KV = Dict[str, Any]
+
+# A filter key is a column name, optionally followed by "__" and one of these operators.
+# Each compiles to a condition that MySQL can answer from an index on the column.
+COMPARISONS = {
+	"eq": "=",
+	"ne": "<>",
+	"lt": "<",
+	"lte": "<=",
+	"gt": ">",
+	"gte": ">=",
+}
+OPERATORS = set(COMPARISONS) | {"in", "startswith", "isnull"}
+
+# The character that escapes % and _ in LIKE patterns. Not a backslash, because MySQL and
+# SQLite read backslashes in string literals differently.
+LIKE_ESCAPE = "!"
+
+TRUE_VALUES = {"1", "true", "yes"}
+FALSE_VALUES = {"0", "false", "no"}
+
+# The SQL shape of one filter: its column, its operator, and for "in" the number of placeholders.
+# Filters with the same conditions share a statement template.
+Condition = Tuple[str, str, int]
+
+# Upper bound on the number of distinct sets of filter keys whose parse is memoized
+PLAN_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def split_key(key: str) -> Tuple[str, str]:
+	"""Splits a filter key into its column and operator, e.g. "year__gte" into ("year", "gte").
+
+	Keys without a known operator suffix are a column compared for equality.
+	"""
+	column, sep, operator = key.rpartition("__")
+	if sep and column and operator in OPERATORS:
+		return column, operator
+	return key, "eq"
+
+
+def in_values(value: Any) -> List:
+	"""The values of an "in" filter: a list, tuple or set, or a comma-separated string."""
+	if isinstance(value, str):
+		return value.split(",") if value else []
+	if isinstance(value, (list, tuple, set, frozenset)):
+		return list(value)
+	raise ValueError(f"an in filter takes a list or a comma-separated string, got {value!r}")
+
+
+def padded_size(n: int) -> int:
+	"""The number of placeholders for an IN list of n values: the next power of two.
+
+	The last value is repeated to fill the list, which doesn't change the result, so that
+	IN lists of different lengths share a few statement templates instead of one per length.
+	"""
+	size = 1
+	while size < n:
+		size *= 2
+	return size
+
+
+def is_null(value: Any) -> bool:
+	"""The value of an "isnull" filter: True, False or a string such as "true" or "0"."""
+	if isinstance(value, bool):
+		return value
+	if str(value).lower() in TRUE_VALUES:
+		return True
+	if str(value).lower() in FALSE_VALUES:
+		return False
+	raise ValueError(f"an isnull filter takes true or false, got {value!r}")
+
+
+def escape_like(prefix: str) -> str:
+	"""Escapes the LIKE wildcards in prefix, so it only matches itself."""
+	for char in (LIKE_ESCAPE, "%", "_"):
+		prefix = prefix.replace(char, LIKE_ESCAPE + char)
+	return prefix
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _plan(keys: Tuple[str, ...]) -> Tuple[Tuple[Tuple[str, str], ...], Optional[Tuple[Condition, ...]]]:
+	"""The column and operator of each key, and the conditions if they don't depend on the
+	values, i.e. if every operator is a comparison.
+	"""
+	parsed = tuple(split_key(key) for key in keys)
+	if all(operator in COMPARISONS for _, operator in parsed):
+		return parsed, tuple((column, operator, 0) for column, operator in parsed)
+	return parsed, None
+
+
+def compile_filters(filters: KV) -> Tuple[Tuple[Condition, ...], List]:
+	"""Turns filters into the shape of their WHERE conditions and the placeholder arguments.
+
+	Keys are parsed once per set of keys, so plain comparisons cost one cache lookup.
+
+	:param filters: Filter keys (see split_key) and their values
+	:returns: The conditions, for condition_sql, and the values for their placeholders
+	:raises ValueError: If the value of an "in" or "isnull" filter is malformed
+	"""
+	if not filters:
+		return (), []
+	parsed, comparisons = _plan(tuple(filters))
+	if comparisons is not None:
+		return comparisons, list(filters.values())
+
+	conditions: List[Condition] = []
+	args: List = []
+	for (column, operator), value in zip(parsed, filters.values()):
+		if operator == "in":
+			values = in_values(value)
+			if values:
+				size = padded_size(len(values))
+				args.extend(values)
+				args.extend([values[-1]] * (size - len(values)))
+			else:
+				size = 0
+			conditions.append((column, operator, size))
+		elif operator == "isnull":
+			conditions.append((column, "isnull" if is_null(value) else "notnull", 0))
+		elif operator == "startswith":
+			conditions.append((column, operator, 0))
+			args.append(escape_like(str(value)) + "%")
+		else:
+			conditions.append((column, operator, 0))
+			args.append(value)
+	return tuple(conditions), args
+
+
+def condition_sql(condition: Condition) -> str:
+	"""The SQL of one condition from compile_filters, with %s placeholders."""
+	column, operator, size = condition
+	if operator in COMPARISONS:
+		return f"{column} {COMPARISONS[operator]} %s"
+	if operator == "in":
+		# MySQL rejects an empty IN list; no row matches one anyway
+		return f"{column} IN ({', '.join(['%s'] * size)})" if size else "1 = 0"
+	if operator == "startswith":
+		return f"{column} LIKE %s ESCAPE '{LIKE_ESCAPE}'"
+	if operator == "isnull":
+		return f"{column} IS NULL"
+	return f"{column} IS NOT NULL"
+
+
+def condition_values(conditions: Sequence[Condition], args: Sequence) -> Iterator[Tuple[str, Any]]:
+	"""Yields each column that the conditions from compile_filters refer to, with every value
+	it is compared to.
+
+	Values of "startswith" and "isnull" filters aren't column values, so they are given as None
+	and should only be checked for the column's existence.
+	"""
+	i = 0
+	for column, operator, size in conditions:
+		if operator == "in":
+			for v in args[i:i + size]:
+				yield column, v
+			i += size
+		elif operator == "startswith":
+			yield column, None
+			i += 1
+		elif operator in ("isnull", "notnull"):
+			yield column, None
+		else:
+			yield column, args[i]
+			i += 1
+
+
+def largest_in_filter(filters: KV) -> Tuple[str, int]:
+	"""The key of the "in" filter with the most values, and how many it has; ("", 0) if none."""
+	key, size = "", 0
+	for k, value in (filters or {}).items():
+		if split_key(k)[1] == "in":
+			n = len(in_values(value))
+			if n > size:
+				key, size = k, n
+	return key, size
+
+
+def chunked(values: Sequence, size: int) -> Iterator[Sequence]:
+	for start in range(0, len(values), size):
+		yield values[start:start + size]
@@ -0,0 +1,54 @@
+import unittest
+
+from filters import compile_filters, condition_sql, condition_values, escape_like, largest_in_filter, padded_size, split_key
+
+
+class FiltersTest(unittest.TestCase):
+    def test_split_key(self):
+        self.assertEqual(("enrollment_year", "gte"), split_key("enrollment_year__gte"))
+        self.assertEqual(("email", "eq"), split_key("email"))
+        # Only known operators are split off
+        self.assertEqual(("first__name", "eq"), split_key("first__name"))
+        self.assertEqual(("__in", "eq"), split_key("__in"))
+
+    def test_compile_filters(self):
+        tests = [
+            ({"ID": 1}, ((("ID", "eq", 0),), [1])),
+            ({"ID__gte": 1, "ID__ne": 5}, ((("ID", "gte", 0), ("ID", "ne", 0)), [1, 5])),
+            # IN lists are padded to a power of two with the last value
+            ({"type__in": "a,b,c"}, ((("type", "in", 4),), ["a", "b", "c", "c"])),
+            ({"type__in": [1]}, ((("type", "in", 1),), [1])),
+            ({"type__in": []}, ((("type", "in", 0),), [])),
+            ({"name__startswith": "50%_o!"}, ((("name", "startswith", 0),), ["50!%!_o!!%"])),
+            ({"email__isnull": "true"}, ((("email", "isnull", 0),), [])),
+            ({"email__isnull": False}, ((("email", "notnull", 0),), [])),
+        ]
+        for filters, want in tests:
+            self.assertEqual(want, compile_filters(filters))
+
+    def test_malformed_values(self):
+        with self.assertRaises(ValueError):
+            compile_filters({"email__isnull": "maybe"})
+        with self.assertRaises(ValueError):
+            compile_filters({"ID__in": 5})
+
+    def test_condition_sql(self):
+        self.assertEqual("ID <= %s", condition_sql(("ID", "lte", 0)))
+        self.assertEqual("ID IN (%s, %s)", condition_sql(("ID", "in", 2)))
+        self.assertEqual("1 = 0", condition_sql(("ID", "in", 0)))
+        self.assertEqual("name LIKE %s ESCAPE '!'", condition_sql(("name", "startswith", 0)))
+        self.assertEqual("email IS NOT NULL", condition_sql(("email", "notnull", 0)))
+
+    def test_helpers(self):
+        self.assertEqual([1, 1, 2, 4, 8, 8], [padded_size(n) for n in (0, 1, 2, 3, 5, 8)])
+        self.assertEqual("a!_b", escape_like("a_b"))
+        self.assertEqual(
+            [("ID", "1"), ("ID", "2"), ("name", None), ("year", 2020)],
+            list(condition_values(*compile_filters({"ID__in": "1,2", "name__startswith": "J", "year__gt": 2020}))),
+        )
+        self.assertEqual(("b__in", 3), largest_in_filter({"a__in": [1], "b__in": "1,2,3", "c": "1,2,3,4"}))
+        self.assertEqual(("", 0), largest_in_filter({"a": 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
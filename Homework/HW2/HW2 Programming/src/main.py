@@ -1,37 +1,475 @@
-from typing import Any, Dict
+import base64
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 # Simple starter project to test installation and environment.
 # Based on https://fastapi.tiangolo.com/tutorial/first-steps/
 from fastapi import FastAPI, Response, Request, status
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 # Explicitly included uvicorn to enable starting within main program.
 # Starting within main program is a simple way to enable running
 # the code within the PyCharm debugger
 import uvicorn
 
-from db import DB
+from backends import HW2_TABLES_SQLITE, Backend, SQLiteBackend
+from cache import ResultCache
+from db import CONFLICT, NOT_FOUND, AsyncDB, BatchError, DB
+from metrics import QueryMetrics, RequestMetrics, render_metric
+from responses import FastJSONResponse, PrerenderedJSONResponse, dumps
+from schema import INTEGER_TYPES, SchemaError, TableSchema
 
 # Type definitions
 KV = Dict[str, Any]  # Key-value pairs
 
-app = FastAPI()
-
 # NOTE: In a prod environment, never put this information in code!
 # There are design patterns for passing confidential information to
 # application.
 # TODO: You may need to change the password
-db = DB(
+# Set HW2_SQLITE to a file (or :memory:) to run against an embedded SQLite database instead,
+# e.g. for benchmarks or as a local read replica. The HW2 tables are created if missing.
+SQLITE_PATH = os.environ.get("HW2_SQLITE")
+# Read replicas, e.g. [MySQLBackend("replica-1", 3306, "root", "dbuserdbuser", "s24_hw2")].
+# Selects are spread over them; writes, transactions and reads right after a write go to the primary.
+REPLICAS: List[Backend] = []
+# Handlers await db calls, which run on a thread pool so a slow query doesn't block the event loop.
+db = AsyncDB(DB(
 	host="localhost",
 	port=3306,
 	user="root",
 	password="dbuserdbuser",
 	database="s24_hw2",
-)
+	min_connections=2,
+	max_connections=20,
+	# Writes made through db invalidate the cache right away; the TTL bounds how long
+	# changes made by anyone else can go unnoticed.
+	result_cache=ResultCache(ttl=5.0),
+	metrics=QueryMetrics(slow_query_seconds=0.5),
+	backend=SQLiteBackend(SQLITE_PATH, init_script=HW2_TABLES_SQLITE) if SQLITE_PATH else None,
+	replicas=REPLICAS,
+))
+# Read the tables once, so requests naming unknown columns are rejected without a round trip
+db.db.load_schema()
+
+# Errors from a write that are the request's fault, such as a duplicate email, and answered with
+# 400. Any other error, e.g. an unreachable database, propagates as a 5xx.
+CLIENT_ERRORS = db.db.backend.integrity_errors + (ValueError,)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	yield
+	db.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Bodies of the responses that never change, serialized once
+BAD_REQUEST = dumps("bad request")
+SUCCESS = dumps("Success")
+EMPTY = dumps("")
+
+request_metrics = RequestMetrics()
+
+@app.middleware("http")
+async def record_request_latency(req: Request, call_next):
+	start = time.perf_counter()
+	# A request that writes a table reads it back from the primary, not from a lagging replica
+	with DB.read_your_writes():
+		response = await call_next(req)
+	# Label by route template (/students/{student_id}), not by path, to keep the number of series bounded
+	route = req.scope.get("route")
+	request_metrics.observe(
+		req.method,
+		route.path if route is not None else "unmatched",
+		response.status_code,
+		time.perf_counter() - start,
+	)
+	return response
+
+# Values of the special `stream` query parameter accepted by the list endpoints
+STREAM_MEDIA_TYPES = {
+	"json": "application/json",
+	"ndjson": "application/x-ndjson",
+}
+
+def stream_rows(
+	chunks: AsyncIterator[List[KV]],
+	stream_format: str,
+	headers: Optional[Dict[str, str]] = None,
+) -> StreamingResponse:
+	"""Streams rows to the client as they are fetched, one chunk of rows per write.
+
+	:param chunks: Chunks of rows, e.g. from AsyncDB.iter_select_chunks
+	:param stream_format: "json" for a single JSON array, "ndjson" for one JSON object per line
+	:param headers: Extra response headers
+	"""
+	async def body():
+		if stream_format == "ndjson":
+			async for chunk in chunks:
+				yield b"".join(dumps(row) + b"\n" for row in chunk)
+			return
+
+		separator = b"["
+		async for chunk in chunks:
+			yield separator + b",".join(dumps(row) for row in chunk)
+			separator = b","
+		yield b"[]" if separator == b"[" else b"]"
+
+	return StreamingResponse(
+		body(),
+		media_type=STREAM_MEDIA_TYPES[stream_format],
+		status_code=status.HTTP_200_OK,
+		headers=headers,
+	)
+
+def not_modified(req: Request, etag: str, exists: bool) -> Optional[Response]:
+	"""Returns a 304 Not Modified response if If-None-Match names etag, else None.
+
+	Tags are compared weakly, as RFC 9110 requires for If-None-Match.
+
+	:param exists: Whether the resource is known to exist. "*" only matches a resource that does.
+	"""
+	if_none_match = req.headers.get("if-none-match")
+	if not if_none_match:
+		return None
+	tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+	if (exists and "*" in tags) or etag.removeprefix("W/") in tags:
+		return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+	return None
+
+async def get_row(req: Request, table: str, filters: KV) -> Response:
+	"""Gets the row of table matching filters, with an ETag; 404 if there is none.
+
+	:param req: The request, checked for If-None-Match
+	:param table: The table to be selected from
+	:param filters: The primary key of the row
+	"""
+	# Read before the query, so a write that lands in between can only make the tag older
+	etag = db.db.versions.etag([table])
+	# The tag was handed out with the row, which can't have been deleted since without a new tag
+	response = not_modified(req, etag, exists=False)
+	if response is not None:
+		return response
+
+	rows = await db.select(table, None, filters)
+	if rows:
+		response = not_modified(req, etag, exists=True)
+		if response is not None:
+			return response
+		return FastJSONResponse(content=rows[0], status_code=status.HTTP_200_OK, headers={"ETag": etag})
+	return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
+
+# Largest page a client may request with `limit`
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(values: List) -> str:
+	"""Encodes the key values of the last row of a page as an opaque `after` token."""
+	return base64.urlsafe_b64encode(dumps(values)).decode()
+
+def decode_cursor(token: str, table: str, order_by: List[str]) -> List:
+	"""Inverse of encode_cursor.
+
+	:param token: The `after` token
+	:param table: The table being paged through
+	:param order_by: The columns the token holds the values of
+	:raises ValueError: If the token is malformed, or doesn't hold one value per order_by column:
+		an integer for an integer column and a string for any other
+	"""
+	values = json.loads(base64.urlsafe_b64decode(token.encode()))
+	if (
+		not isinstance(values, list)
+		or len(values) != len(order_by)
+		or not all(isinstance(v, (int, str)) and not isinstance(v, bool) for v in values)
+	):
+		raise ValueError(f"invalid cursor: {token}")
+	table_schema = db.db.schema.get(table)
+	if table_schema is not None:
+		for name, value in zip(order_by, values):
+			# The database would cast a value of another type: MySQL compares student_id > 'abc'
+			# as student_id > 0, and SQLite sorts every integer before any string
+			if (table_schema.columns[name].data_type in INTEGER_TYPES) != isinstance(value, int):
+				raise ValueError(f"invalid cursor for {table}.{name}: {token}")
+	return values
+
+async def list_rows(req: Request, table: str, key: str) -> Response:
+	"""Gets the rows of table that satisfy the query parameters of req.
+
+	`fields`, `stream`, `limit` and `after` are special query parameters; the others are filters,
+	with the operator suffixes of DB.build_select_query.
+	If `limit` or `after` is given, rows are paged in order of key, and a full page carries
+	the `after` token for the next page in the X-Next-Cursor header.
+
+	Responses carry an ETag that changes when table is written to. A request whose If-None-Match
+	names the current tag gets 304 Not Modified without a query.
+
+	:param req: The request that optionally contains query parameters
+	:param table: The table to be selected from
+	:param key: The primary key of table
+	"""
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
+
+	query_params = dict(req.query_params)
+
+	fields = query_params.pop('fields', None)
+	if fields:
+		fields = fields.split(',')
+
+	stream_format = query_params.pop('stream', None)
+	limit = query_params.pop('limit', None)
+	after = query_params.pop('after', None)
+	paged = limit is not None or after is not None
+
+	try:
+		db.db.check(table, fields or (), filters=query_params)
+	except ValueError:
+		# SchemaError, or a malformed in or isnull filter
+		return bad_request
+	if stream_format and (stream_format not in STREAM_MEDIA_TYPES or paged):
+		return bad_request
+
+	# Read before the query, so a write that lands in between can only make the tag older
+	etag = db.db.versions.etag([table])
+	# A list exists even when it is empty
+	response = not_modified(req, etag, exists=True)
+	if response is not None:
+		return response
+	headers = {"ETag": etag}
+
+	if stream_format:
+		return stream_rows(db.iter_select_chunks(table, fields, query_params), stream_format, headers)
+
+	if not paged:
+		rows = await db.select(table, fields, query_params)
+		return FastJSONResponse(content=rows, status_code=status.HTTP_200_OK, headers=headers)
+
+	try:
+		limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+		after = decode_cursor(after, table, [key]) if after is not None else None
+	except ValueError:
+		return bad_request
+	if limit < 1 or limit > MAX_PAGE_SIZE:
+		return bad_request
+
+	# The cursor is made from the key, so it has to be selected even if `fields` leaves it out
+	columns = fields if not fields or key in fields else fields + [key]
+	rows = await db.select(table, columns, query_params, [key], limit, after)
+
+	if len(rows) == limit:
+		headers["X-Next-Cursor"] = encode_cursor([rows[-1][key]])
+	if columns is not fields:
+		for row in rows:
+			del row[key]
+
+	return FastJSONResponse(content=rows, status_code=status.HTTP_200_OK, headers=headers)
+
+EMPLOYEE_TYPES = ['Professor', 'Lecturer', 'Staff']
+
+def validate_student(student_data: KV, creating: bool) -> Optional[str]:
+	"""Checks a student against the rules shared by the single and batch endpoints.
+
+	:param student_data: The attributes of the student, without student_id
+	:param creating: True for a new student, False for an update
+	:returns: Why the student is invalid, or None if it is valid
+	"""
+	if not student_data:
+		# An update must set something; there is no statement for an empty one
+		return "at least one attribute is required"
+	if creating and 'email' not in student_data:
+		return "email is required"
+	if 'email' in student_data and student_data['email'] is None:
+		return "email must not be null"
+	if 'enrollment_year' in student_data:
+		try:
+			year = int(student_data['enrollment_year'])
+		except (TypeError, ValueError):
+			return "enrollment_year must be an integer"
+		if year < 2016 or year > 2023:
+			return "enrollment_year must be between 2016 and 2023"
+	return None
+
+def validate_employee(employee_data: KV, creating: bool) -> Optional[str]:
+	"""Checks an employee against the rules shared by the single and batch endpoints.
+
+	:param employee_data: The attributes of the employee, without employee_id
+	:param creating: True for a new employee, False for an update
+	:returns: Why the employee is invalid, or None if it is valid
+	"""
+	if not employee_data:
+		# An update must set something; there is no statement for an empty one
+		return "at least one attribute is required"
+	if creating and 'email' not in employee_data:
+		return "email is required"
+	if 'email' in employee_data and employee_data['email'] is None:
+		return "email must not be null"
+	if creating and 'employee_type' not in employee_data:
+		return "employee_type is required"
+	if 'employee_type' in employee_data and employee_data['employee_type'] not in EMPLOYEE_TYPES:
+		return f"employee_type must be one of {EMPLOYEE_TYPES}"
+	return None
+
+# Largest number of items accepted by a batch endpoint
+MAX_BATCH_SIZE = 1000
+
+# HTTP status of batch items rejected by the database, see BatchError
+BATCH_ERROR_STATUS = {
+	NOT_FOUND: status.HTTP_404_NOT_FOUND,
+	CONFLICT: status.HTTP_400_BAD_REQUEST,
+}
+
+Validator = Callable[[KV, bool], Optional[str]]
+
+def batch_response(n_items: int, errors: Dict[int, Tuple[int, str]], success_status: int) -> FastJSONResponse:
+	"""Builds the response of a batch endpoint, with one status per item.
+
+	Batches are all or nothing. If any item failed, the failed items carry their own status and
+	error, the others 424 Failed Dependency, and the response is 404 if every failure was a
+	missing row and 400 otherwise.
+
+	:param n_items: The number of items in the batch
+	:param errors: The HTTP status and error message of each failed item, by index
+	:param success_status: The status of each item, and of the response, if nothing failed
+	"""
+	if not errors:
+		items = [{"index": i, "status": success_status} for i in range(n_items)]
+		return FastJSONResponse(content={"items": items}, status_code=success_status)
+
+	items = []
+	for i in range(n_items):
+		if i in errors:
+			item_status, message = errors[i]
+			items.append({"index": i, "status": item_status, "error": message})
+		else:
+			items.append({"index": i, "status": status.HTTP_424_FAILED_DEPENDENCY})
+	if all(item_status == status.HTTP_404_NOT_FOUND for item_status, _ in errors.values()):
+		response_status = status.HTTP_404_NOT_FOUND
+	else:
+		response_status = status.HTTP_400_BAD_REQUEST
+	return FastJSONResponse(content={"items": items}, status_code=response_status)
+
+async def read_batch(req: Request) -> Optional[List]:
+	"""Returns the items in the body of a batch request, or None if the body isn't a usable list."""
+	try:
+		items = await req.json()
+	except ValueError:
+		return None
+	if not isinstance(items, list) or not items or len(items) > MAX_BATCH_SIZE:
+		return None
+	return items
+
+def unique_columns(table: str) -> List[str]:
+	"""Columns of table, other than its key, whose values must be unique."""
+	table_schema = db.db.schema.get(table)
+	return table_schema.unique_columns if table_schema is not None else ['email']
+
+def rejected_by_db(e: BatchError) -> Dict[int, Tuple[int, str]]:
+	return {i: (BATCH_ERROR_STATUS[kind], message) for i, (kind, message) in e.errors.items()}
+
+async def post_batch(req: Request, table: str, validate: Validator) -> Response:
+	"""Creates every row in the body of req, or none of them. See batch_response."""
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
+	items = await read_batch(req)
+	if items is None:
+		return bad_request
+
+	errors = {}
+	for i, item in enumerate(items):
+		message = validate(item, True) if isinstance(item, dict) and item else "item must be a non-empty object"
+		if message:
+			errors[i] = (status.HTTP_400_BAD_REQUEST, message)
+	if errors:
+		return batch_response(len(items), errors, status.HTTP_201_CREATED)
+
+	try:
+		await db.insert_batch(table, items, unique_columns(table))
+	except BatchError as e:
+		return batch_response(len(items), rejected_by_db(e), status.HTTP_201_CREATED)
+	except CLIENT_ERRORS:
+		return bad_request
+	return batch_response(len(items), {}, status.HTTP_201_CREATED)
+
+async def patch_batch(req: Request, table: str, key: str, validate: Validator) -> Response:
+	"""Updates every row in the body of req, identified by key, or none of them. See batch_response."""
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
+	items = await read_batch(req)
+	if items is None:
+		return bad_request
+
+	errors = {}
+	for i, item in enumerate(items):
+		if not isinstance(item, dict) or not isinstance(item.get(key), int) or isinstance(item[key], bool) or len(item) < 2:
+			message = f"item must be an object with an integer {key} and the attributes to update"
+		else:
+			message = validate({k: v for k, v in item.items() if k != key}, False)
+		if message:
+			errors[i] = (status.HTTP_400_BAD_REQUEST, message)
+	if errors:
+		return batch_response(len(items), errors, status.HTTP_200_OK)
+
+	try:
+		await db.update_batch(table, key, items, unique_columns(table))
+	except BatchError as e:
+		return batch_response(len(items), rejected_by_db(e), status.HTTP_200_OK)
+	except CLIENT_ERRORS:
+		return bad_request
+	return batch_response(len(items), {}, status.HTTP_200_OK)
+
+async def delete_batch(req: Request, table: str, key: str) -> Response:
+	"""Deletes every row whose key is in the body of req, or none of them. See batch_response."""
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
+	items = await read_batch(req)
+	if items is None:
+		return bad_request
+
+	errors = {
+		i: (status.HTTP_400_BAD_REQUEST, f"item must be an integer {key}")
+		for i, item in enumerate(items)
+		if not isinstance(item, int) or isinstance(item, bool)
+	}
+	if errors:
+		return batch_response(len(items), errors, status.HTTP_200_OK)
+
+	try:
+		await db.delete_batch(table, key, items)
+	except BatchError as e:
+		return batch_response(len(items), rejected_by_db(e), status.HTTP_200_OK)
+	except CLIENT_ERRORS:
+		return bad_request
+	return batch_response(len(items), {}, status.HTTP_200_OK)
 
 @app.get("/")
 async def healthcheck():
 	return HTMLResponse(content="<h1>Heartbeat</h1>", status_code=status.HTTP_200_OK)
 
+@app.get("/metrics")
+async def get_metrics():
+	"""Reports request, query, connection pool and cache statistics in the Prometheus text format."""
+	pools = [("primary", db.db.pool)] + [(f"replica{i}", pool) for i, pool in enumerate(db.db.replica_pools)]
+	lines = request_metrics.render() + db.db.metrics.render()
+	lines += render_metric("db_pool_connections", "gauge", "Open connections in the pool.", [
+		sample
+		for name, pool in pools
+		for sample in (
+			((("pool", name), ("state", "idle")), pool.idle),
+			((("pool", name), ("state", "in_use")), pool.size - pool.idle),
+		)
+	])
+	flight_stats = db.db.flights.stats()
+	lines += render_metric("db_select_calls_total", "counter", "Selects that missed the result cache, by whether they shared another call's query.", [
+		((("shared", "false"),), flight_stats["calls"] - flight_stats["shared"]),
+		((("shared", "true"),), flight_stats["shared"]),
+	])
+	if db.db.result_cache is not None:
+		cache_stats = db.db.result_cache.stats()
+		lines += render_metric("db_result_cache_lookups_total", "counter", "Result cache lookups.", [
+			((("result", "hit"),), cache_stats["hits"]),
+			((("result", "miss"),), cache_stats["misses"]),
+		])
+		lines += render_metric("db_result_cache_bytes", "gauge", "Estimated size of cached results.", [
+			((), cache_stats["bytes"]),
+		])
+	return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 
 # TODO: all methods below
 
@@ -63,40 +501,76 @@ async def get_students(req: Request):
 	should return the first name and email for students whose first name is John.
 	Not every request will have a `fields` parameter.
 
-	You can assume the query parameters are valid attribute names in the student table
-	(except `fields`).
+	The optional query parameter `stream` streams the result instead of building it in memory:
+	`stream=json` sends a JSON array and `stream=ndjson` sends one JSON object per line.
+		GET http://0.0.0.0:8002/students?stream=ndjson
+
+	The optional query parameters `limit` and `after` page through the result in order of
+	student_id. A full page carries the `after` token of the next page in the X-Next-Cursor header.
+		GET http://0.0.0.0:8002/students?limit=100&after=WzEwMF0=
+
+	A filter can end in an operator: `__ne`, `__lt`, `__lte`, `__gt`, `__gte`, `__in` (a
+	comma-separated list), `__startswith` or `__isnull` (true or false). The filtering happens
+	in the database, where an index on the attribute can serve it.
+		GET http://0.0.0.0:8002/students?enrollment_year__gte=2020&last_name__startswith=Mc
+
+	You can assume the query parameters are valid attribute names in the student table, with an
+	optional operator (except `fields`, `stream`, `limit` and `after`).
 
 	:param req: The request that optionally contains query parameters
 	:returns: A list of dicts representing students. The HTTP status should be set to 200 OK.
 	"""
+	return await list_rows(req, 'student', 'student_id')
 
-	# Use `dict(req.query_params)` to access query parameters
-<<<<<<< HEAD
-	# Convert query parameters to a dictionary
-	query_params = dict(req.query_params)
+# The batch routes come before /students/{student_id} so "batch" isn't taken for an ID.
 
-	fields = query_params.pop('fields', None)
-	if fields:
-		fields = fields.split(',')
+@app.post("/students/batch")
+async def post_students_batch(req: Request):
+	"""Creates many students in one transaction.
 
-	rows = db.select('student', fields, query_params)
+	The body is a JSON list of students, each following the same rules as POST /students.
+		POST http://0.0.0.0:8002/students/batch
+		[{"email": "a@columbia.edu", ...}, {"email": "b@columbia.edu", ...}]
 
-	return JSONResponse(content=rows, status_code=status.HTTP_200_OK)
-=======
+	:param req: The request, which contains a list of student JSONs in its body
+	:returns: One status per item. If every item is valid, all are created and the HTTP status is
+				201 Created. Otherwise none are, and the HTTP status is 400 Bad Request.
+	"""
+	return await post_batch(req, 'student', validate_student)
 
-	try:
-		# raise NotImplemented()
-		result = [
-			{"cat": True},
-			{"canary": "Bird"}
-		]
-	except Exception as e:
-		response = JSONResponse(content=result, status_code=200)
+@app.patch("/students/batch")
+async def patch_students_batch(req: Request):
+	"""Updates many students in one transaction.
 
->>>>>>> 9c8b2d1f4a2c2807025909df0d432b6eb58b0fc0
+	The body is a JSON list of partial students, each with the `student_id` of the student to update and
+	following the same rules as PUT /students/{student_id}.
+		PATCH http://0.0.0.0:8002/students/batch
+		[{"student_id": 1, "first_name": "Joe"}, {"student_id": 2, "last_name": "Doe"}]
+
+	:param req: The request, which contains a list of student JSONs in its body
+	:returns: One status per item. If every item is valid, all are updated and the HTTP status is
+				200 OK. Otherwise none are, and the HTTP status is 404 Not Found if the only problem
+				is missing students, 400 Bad Request if not.
+	"""
+	return await patch_batch(req, 'student', 'student_id', validate_student)
+
+@app.delete("/students/batch")
+async def delete_students_batch(req: Request):
+	"""Deletes many students in one transaction.
+
+	The body is a JSON list of student IDs.
+		DELETE http://0.0.0.0:8002/students/batch
+		[1, 2, 3]
+
+	:param req: The request, which contains a list of student IDs in its body
+	:returns: One status per item. If every student exists, all are deleted and the HTTP status is
+				200 OK. Otherwise none are, and the HTTP status is 404 Not Found for missing students
+				or 400 Bad Request for malformed IDs.
+	"""
+	return await delete_batch(req, 'student', 'student_id')
 
 @app.get("/students/{student_id}")
-async def get_student(student_id: int):
+async def get_student(student_id: int, req: Request):
 	"""Gets a student by ID.
 
 	For instance,
@@ -106,17 +580,14 @@ async def get_student(student_id: int):
 
 	If the student ID doesn't exist, the HTTP status should be set to 404 Not Found.
 
+	The response carries an ETag; If-None-Match with the current tag gets 304 Not Modified.
+
 	:param student_id: The ID to be matched
+	:param req: The request, checked for If-None-Match
 	:returns: If the student ID exists, a dict representing the student with HTTP status set to 200 OK.
 				If the student ID doesn't exist, the HTTP status should be set to 404 Not Found.
 	"""
-	filters = {'student_id': student_id}
-	students = db.select('student', None, filters)
-
-	if students:
-		return JSONResponse(content=students[0], status_code=status.HTTP_200_OK)
-	else:
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
+	return await get_row(req, 'student', {'student_id': student_id})
 	
 
 @app.post("/students")
@@ -148,31 +619,21 @@ async def post_student(req: Request):
 	# Use `await req.json()` to access the request body
 	student_data = await req.json()
 
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 	
 
-	if 'email' not in student_data:
-		return bad_request
-	
-	existing_students = db.select('student', None, {'email': student_data['email']})
-	if existing_students:
+	if validate_student(student_data, creating=True):
 		return bad_request
-	
-	if 'enrollment_year' in student_data:
-		try:
-			year = int(student_data['enrollment_year'])
-			if year < 2016 or year > 2023: 
-				return bad_request
-		except:
-			return bad_request
 
+	# A duplicate email violates the unique index on email and fails the insert, so
+	# it isn't looked up beforehand.
 	try:
-		n_rows = db.insert('student', student_data)
+		n_rows = await db.insert('student', student_data)
 		if n_rows == 0:
 			return bad_request
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_201_CREATED)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_201_CREATED)
+	except CLIENT_ERRORS:
 		return bad_request
 
 
@@ -208,36 +669,22 @@ async def put_student(student_id: int, req: Request):
 
 	# Use `await req.json()` to access the request body
 	student_data = await req.json()
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 
 	filters = {'student_id': student_id}
-	student = db.select('student', None, filters)
-	if not student: 
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
-	
-	if 'email' in student_data:
-		if student_data['email'] == None:
-			return bad_request 
 
-		existing_students = db.select('student', None, {'email': student_data['email']})
-		if existing_students:
-			return bad_request
-	
-	if 'enrollment_year' in student_data:
-		try:
-			year = int(student_data['enrollment_year'])
-			if year < 2016 or year > 2023:
-				return bad_request
-		except:
-			return bad_request
-	
+	if validate_student(student_data, creating=False):
+		return bad_request
+
+	# Existence and email uniqueness are checked by the update itself: a duplicate email fails
+	# on the unique index, and a missing student matches no rows.
 	try:
-		n_rows = db.update('student', student_data, filters)
+		n_rows = await db.update('student', student_data, filters)
 		if n_rows == 0:
-			return bad_request
+			return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_200_OK)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_200_OK)
+	except CLIENT_ERRORS:
 		return bad_request
 	
 
@@ -257,19 +704,15 @@ async def delete_student(student_id: int):
 				If the request is not valid, the HTTP status should be set to 404 Not Found.
 	"""
 	filters = {'student_id': student_id}
-	student = db.select('student', None, filters)
-	if not student: 
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
-	
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 
 	try:
-		n_rows = db.delete('student', filters)
+		n_rows = await db.delete('student', filters)
 		if n_rows == 0:
-			return bad_request
+			return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_200_OK)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_200_OK)
+	except CLIENT_ERRORS:
 		return bad_request
 	
 
@@ -295,26 +738,76 @@ async def get_employees(req: Request):
 	should return the first name and email for employees whose first name is Don.
 	Not every request will have a `fields` parameter.
 
-	You can assume the query parameters are valid attribute names in the employee table
-	(except `fields`).
+	The optional query parameter `stream` streams the result instead of building it in memory:
+	`stream=json` sends a JSON array and `stream=ndjson` sends one JSON object per line.
+		GET http://0.0.0.0:8002/employees?stream=ndjson
+
+	The optional query parameters `limit` and `after` page through the result in order of
+	employee_id. A full page carries the `after` token of the next page in the X-Next-Cursor header.
+		GET http://0.0.0.0:8002/employees?limit=100&after=WzEwMF0=
+
+	A filter can end in an operator: `__ne`, `__lt`, `__lte`, `__gt`, `__gte`, `__in` (a
+	comma-separated list), `__startswith` or `__isnull` (true or false). The filtering happens
+	in the database, where an index on the attribute can serve it.
+		GET http://0.0.0.0:8002/employees?employee_type__in=Professor,Lecturer&email__isnull=false
+
+	You can assume the query parameters are valid attribute names in the employee table, with an
+	optional operator (except `fields`, `stream`, `limit` and `after`).
 
 	:param req: The request that optionally contains query parameters
 	:returns: A list of dicts representing employees. The HTTP status should be set to 200 OK.
 	"""
+	return await list_rows(req, 'employee', 'employee_id')
 
-	# Use `dict(req.query_params)` to access query parameters
-	query_params = dict(req.query_params)
+# The batch routes come before /employees/{employee_id} so "batch" isn't taken for an ID.
 
-	fields = query_params.pop('fields', None)
-	if fields:
-		fields = fields.split(',')
+@app.post("/employees/batch")
+async def post_employees_batch(req: Request):
+	"""Creates many employees in one transaction.
+
+	The body is a JSON list of employees, each following the same rules as POST /employees.
+		POST http://0.0.0.0:8002/employees/batch
+		[{"email": "a@columbia.edu", ...}, {"email": "b@columbia.edu", ...}]
+
+	:param req: The request, which contains a list of employee JSONs in its body
+	:returns: One status per item. If every item is valid, all are created and the HTTP status is
+				201 Created. Otherwise none are, and the HTTP status is 400 Bad Request.
+	"""
+	return await post_batch(req, 'employee', validate_employee)
+
+@app.patch("/employees/batch")
+async def patch_employees_batch(req: Request):
+	"""Updates many employees in one transaction.
+
+	The body is a JSON list of partial employees, each with the `employee_id` of the employee to update and
+	following the same rules as PUT /employees/{employee_id}.
+		PATCH http://0.0.0.0:8002/employees/batch
+		[{"employee_id": 1, "first_name": "Joe"}, {"employee_id": 2, "last_name": "Doe"}]
+
+	:param req: The request, which contains a list of employee JSONs in its body
+	:returns: One status per item. If every item is valid, all are updated and the HTTP status is
+				200 OK. Otherwise none are, and the HTTP status is 404 Not Found if the only problem
+				is missing employees, 400 Bad Request if not.
+	"""
+	return await patch_batch(req, 'employee', 'employee_id', validate_employee)
+
+@app.delete("/employees/batch")
+async def delete_employees_batch(req: Request):
+	"""Deletes many employees in one transaction.
 
-	rows = db.select('employee', fields, query_params)
+	The body is a JSON list of employee IDs.
+		DELETE http://0.0.0.0:8002/employees/batch
+		[1, 2, 3]
 
-	return JSONResponse(content=rows, status_code=status.HTTP_200_OK)
+	:param req: The request, which contains a list of employee IDs in its body
+	:returns: One status per item. If every employee exists, all are deleted and the HTTP status is
+				200 OK. Otherwise none are, and the HTTP status is 404 Not Found for missing employees
+				or 400 Bad Request for malformed IDs.
+	"""
+	return await delete_batch(req, 'employee', 'employee_id')
 
 @app.get("/employees/{employee_id}")
-async def get_employee(employee_id: int):
+async def get_employee(employee_id: int, req: Request):
 	"""Gets an employee by ID.
 
 	For instance,
@@ -324,17 +817,14 @@ async def get_employee(employee_id: int):
 
 	If the employee ID doesn't exist, the HTTP status should be set to 404 Not Found.
 
+	The response carries an ETag; If-None-Match with the current tag gets 304 Not Modified.
+
 	:param employee_id: The ID to be matched
+	:param req: The request, checked for If-None-Match
 	:returns: If the employee ID exists, a dict representing the employee with HTTP status set to 200 OK.
 				If the employee ID doesn't exist, the HTTP status should be set to 404 Not Found.
 	"""
-	filters = {'employee_id': employee_id}
-	employees = db.select('employee', None, filters)
-
-	if employees:
-		return JSONResponse(content=employees[0], status_code=status.HTTP_200_OK)
-	else:
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
+	return await get_row(req, 'employee', {'employee_id': employee_id})
 
 @app.post("/employees")
 async def post_employee(req: Request):
@@ -365,35 +855,21 @@ async def post_employee(req: Request):
 	# Use `await req.json()` to access the request body
 	employee_data = await req.json()
 
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 	
 
-	if 'email' not in employee_data:
+	if validate_employee(employee_data, creating=True):
 		return bad_request
-	
-	existing_employees = db.select('employee', None, {'email': employee_data['email']})
-	if existing_employees:
-		return bad_request
-	
-	if 'employee_type' not in employee_data:
-		return bad_request
-	
-	
-	try:
-		employee_type = employee_data['employee_type']
-		if employee_type not in ['Professor', 'Lecturer', 'Staff']:
-			return bad_request
-	except:
-		bad_request
-	
 
+	# A duplicate email violates the unique index on email and fails the insert, so
+	# it isn't looked up beforehand.
 	try:
-		n_rows = db.insert('employee', employee_data)
+		n_rows = await db.insert('employee', employee_data)
 		if n_rows == 0:
 			return bad_request
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_201_CREATED)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_201_CREATED)
+	except CLIENT_ERRORS:
 		return bad_request
 
 @app.put("/employees/{employee_id}")
@@ -424,39 +900,22 @@ async def put_employee(employee_id: int, req: Request):
 
 	# Use `await req.json()` to access the request body
 	employee_data = await req.json()
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 
 	filters = {'employee_id': employee_id}
-	employee = db.select('employee', None, filters)
-	if not employee: 
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
-	
-	if 'email' in employee_data:
-		if employee_data['email'] == None:
-			return bad_request 
 
-		existing_employees = db.select('employee', None, {'email': employee_data['email']})
-		if existing_employees:
-			return bad_request
-	
-
-	
-	
-	try:
-		employee_type = employee_data['employee_type']
-		if employee_type not in ['Professor', 'Lecturer', 'Staff']:
-			return bad_request
-	except:
-		bad_request
+	if validate_employee(employee_data, creating=False):
+		return bad_request
 
-	
+	# Existence and email uniqueness are checked by the update itself: a duplicate email fails
+	# on the unique index, and a missing employee matches no rows.
 	try:
-		n_rows = db.update('employee', employee_data, filters)
+		n_rows = await db.update('employee', employee_data, filters)
 		if n_rows == 0:
-			return bad_request
+			return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_200_OK)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_200_OK)
+	except CLIENT_ERRORS:
 		return bad_request
 
 @app.delete("/employees/{employee_id}")
@@ -474,20 +933,47 @@ async def delete_employee(employee_id: int):
 				If the request is not valid, the HTTP status should be set to 404 Not Found.
 	"""
 	filters = {'employee_id': employee_id}
-	employee = db.select('employee', None, filters)
-	if not employee: 
-		return JSONResponse(content="",status_code=status.HTTP_404_NOT_FOUND)
-	
-	bad_request = JSONResponse(content="bad request",status_code=status.HTTP_400_BAD_REQUEST)
+	bad_request = PrerenderedJSONResponse(BAD_REQUEST, status_code=status.HTTP_400_BAD_REQUEST)
 
 	try:
-		n_rows = db.delete('employee', filters)
+		n_rows = await db.delete('employee', filters)
 		if n_rows == 0:
-			return bad_request
+			return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
 		
-		return JSONResponse(content="Success", status_code=status.HTTP_200_OK)
-	except:
+		return PrerenderedJSONResponse(SUCCESS, status_code=status.HTTP_200_OK)
+	except CLIENT_ERRORS:
 		return bad_request
 
+# --- OTHER TABLES ---
+
+def add_table_routes(table: TableSchema):
+	"""Adds read-only routes for a table without hand-written handlers.
+
+	GET /<table> works like GET /students, and GET /<table>/<key> gets a row by its primary key.
+
+	:param table: The table's schema. It must have a single-column primary key.
+	"""
+	key = table.primary_key[0]
+
+	async def get_rows(req: Request):
+		return await list_rows(req, table.name, key)
+
+	async def get_one(row_id: str, req: Request):
+		try:
+			return await get_row(req, table.name, {key: row_id})
+		except SchemaError:
+			return PrerenderedJSONResponse(EMPTY, status_code=status.HTTP_404_NOT_FOUND)
+
+	app.add_api_route(f"/{table.name}", get_rows, methods=["GET"], name=f"get_{table.name}_rows")
+	app.add_api_route(f"/{table.name}/{{row_id}}", get_one, methods=["GET"], name=f"get_{table.name}_row")
+
+for table_schema in db.db.schema.values():
+	if (
+		table_schema.name not in ('student', 'employee')
+		and table_schema.name.isidentifier()
+		and len(table_schema.primary_key) == 1
+	):
+		add_table_routes(table_schema)
+
 if __name__ == "__main__":
 	uvicorn.run(app, host="0.0.0.0", port=8002)
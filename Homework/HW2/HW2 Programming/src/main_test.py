@@ -0,0 +1,148 @@
+import base64
+import os
+import unittest
+from unittest import mock
+
+# main connects when imported, so point it at an embedded database first
+os.environ.setdefault("HW2_SQLITE", ":memory:")
+
+from fastapi.testclient import TestClient
+import pymysql
+
+import main
+from backends import MySQLBackend
+from pool import PoolTimeout
+
+
+def cursor(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+class PagingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(main.app)
+
+    def setUp(self):
+        main.db.db.delete("student", {})
+        main.db.db.insert_many("student", [{"first_name": f"n{i}", "email": f"{i}@x.com"} for i in range(5)])
+        self.ids = [row["student_id"] for row in main.db.db.select("student", ["student_id"], {}, ["student_id"])]
+
+    def test_pages(self):
+        response = self.client.get("/students", params={"limit": 2, "fields": "email"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([{"email": "0@x.com"}, {"email": "1@x.com"}], response.json())
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = self.client.get("/students", params=params)
+            self.assertEqual(200, response.status_code)
+            seen.extend(row["student_id"] for row in response.json())
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["after"] = response.headers["X-Next-Cursor"]
+        self.assertEqual(self.ids, seen)
+
+    def test_bad_cursors(self):
+        for token in ["not base64!", cursor("{}"), cursor("[]"), cursor("[1,2]"), cursor('[{"a":1}]'), cursor("[true]"), cursor("[null]"),
+                      # student_id is an integer
+                      cursor('["abc"]'), cursor('["2"]')]:
+            response = self.client.get("/students", params={"after": token})
+            self.assertEqual(400, response.status_code, token)
+
+    def test_repeated_fields(self):
+        self.assertEqual(400, self.client.get("/students", params={"fields": "email,email"}).status_code)
+        # The key is added to page by, which doesn't count as a repetition
+        self.assertEqual(200, self.client.get("/students", params={"fields": "student_id,email", "limit": 2}).status_code)
+
+    def test_bad_limits(self):
+        for limit in ["0", "x", str(main.MAX_PAGE_SIZE + 1)]:
+            self.assertEqual(400, self.client.get("/students", params={"limit": limit}).status_code)
+
+
+class ETagTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(main.app)
+
+    def setUp(self):
+        main.db.db.delete("student", {})
+        main.db.db.insert("student", {"email": "a@x.com"})
+        self.path = f"/students/{main.db.db.select('student', ['student_id'], {})[0]['student_id']}"
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.path)
+        self.assertEqual(200, response.status_code)
+        etag = response.headers["ETag"]
+        for if_none_match in (etag, f'"x", {etag}', etag.removeprefix("W/"), "*"):
+            response = self.client.get(self.path, headers={"If-None-Match": if_none_match})
+            self.assertEqual(304, response.status_code, if_none_match)
+            self.assertEqual(etag, response.headers["ETag"])
+        self.assertEqual(304, self.client.get("/students", headers={"If-None-Match": "*"}).status_code)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(self.path).headers["ETag"]
+        self.assertEqual(200, self.client.put(self.path, json={"first_name": "Joe"}).status_code)
+        response = self.client.get(self.path, headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("Joe", response.json()["first_name"])
+        self.assertNotEqual(etag, response.headers["ETag"])
+        self.assertEqual(304, self.client.get(self.path, headers={"If-None-Match": response.headers["ETag"]}).status_code)
+
+    def test_star_on_missing_row_is_not_found(self):
+        self.assertEqual(404, self.client.get("/students/12345", headers={"If-None-Match": "*"}).status_code)
+        self.assertEqual(404, self.client.get("/employees/12345", headers={"If-None-Match": "*"}).status_code)
+
+
+class WriteErrorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Unhandled errors become 500 responses instead of being raised in the test
+        cls.client = TestClient(main.app, raise_server_exceptions=False)
+
+    def setUp(self):
+        main.db.db.delete("student", {})
+        main.db.db.insert("student", {"email": "a@x.com"})
+        self.student_id = main.db.db.select("student", ["student_id"], {})[0]["student_id"]
+
+    def test_constraint_violations_are_bad_requests(self):
+        self.assertEqual(400, self.client.post("/students", json={"email": "a@x.com"}).status_code)
+        self.assertEqual(400, self.client.put(f"/students/{self.student_id}", json={"nickname": "x"}).status_code)
+        response = self.client.post("/students/batch", json=[{"email": "b@x.com", "nickname": "x"}])
+        self.assertEqual(400, response.status_code)
+
+    def test_bad_values_are_bad_requests(self):
+        # What MySQL raises for a value that doesn't fit its column, e.g. a too long name
+        data_error = main.db.db.backend.integrity_errors[-1]
+        self.assertIn(pymysql.err.DataError, MySQLBackend.integrity_errors)
+        with mock.patch.object(main.db.db, "execute_query", side_effect=data_error("Data too long")):
+            self.assertEqual(400, self.client.post("/students", json={"email": "b@x.com"}).status_code)
+            self.assertEqual(400, self.client.put(f"/students/{self.student_id}", json={"first_name": "x"}).status_code)
+        with mock.patch.object(main.db.db, "_insert_many_on", side_effect=data_error("Data too long")):
+            self.assertEqual(400, self.client.post("/students/batch", json=[{"email": "b@x.com"}]).status_code)
+
+    def test_empty_updates_are_bad_requests(self):
+        main.db.db.delete("employee", {})
+        main.db.db.insert("employee", {"email": "e@x.com", "employee_type": "Staff"})
+        employee_id = main.db.db.select("employee", ["employee_id"], {})[0]["employee_id"]
+        for path in (f"/students/{self.student_id}", f"/employees/{employee_id}"):
+            self.assertEqual(400, self.client.put(path, json={}).status_code, path)
+        self.assertEqual(["e@x.com"], [row["email"] for row in main.db.db.select("employee", ["email"], {})])
+
+    def test_batch_ids_must_not_be_booleans(self):
+        response = self.client.patch("/students/batch", json=[{"student_id": True, "first_name": "x"}])
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(400, self.client.request("DELETE", "/students/batch", json=[True]).status_code)
+        self.assertEqual([None], [row["first_name"] for row in main.db.db.select("student", ["first_name"], {})])
+
+    def test_database_failures_are_server_errors(self):
+        for error in (PoolTimeout("no connection"), main.db.db.backend.broken_connection_errors[0]("gone")):
+            with mock.patch.object(main.db.db, "execute_query", side_effect=error):
+                self.assertEqual(500, self.client.post("/students", json={"email": "b@x.com"}).status_code)
+                self.assertEqual(500, self.client.put(f"/students/{self.student_id}", json={"first_name": "x"}).status_code)
+                self.assertEqual(500, self.client.delete(f"/students/{self.student_id}").status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
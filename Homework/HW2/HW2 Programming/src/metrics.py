@@ -0,0 +1,173 @@
+import bisect
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("db")
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Statement shape under which QueryMetrics counts statements once it tracks max_statements shapes
+OVERFLOW_STATEMENT = "other"
+
+
+class Histogram:
+	"""A fixed-bucket histogram, rendered the way Prometheus expects (cumulative buckets)."""
+
+	def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+		self.buckets = tuple(buckets)
+		# One count per bucket, plus one for values above the last bucket
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value: float):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def quantile(self, q: float) -> float:
+		"""Estimates the q-quantile as the upper bound of the bucket it falls in."""
+		if not self.count:
+			return 0.0
+		rank = q * self.count
+		seen = 0
+		for bound, n in zip(self.buckets, self.counts):
+			seen += n
+			if seen >= rank:
+				return bound
+		return float("inf")
+
+	def render(self, name: str, labels: Labels) -> List[str]:
+		lines = []
+		seen = 0
+		for bound, n in zip(self.buckets, self.counts):
+			seen += n
+			lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {seen}")
+		lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {self.count}")
+		lines.append(f"{name}_sum{format_labels(labels)} {self.sum}")
+		lines.append(f"{name}_count{format_labels(labels)} {self.count}")
+		return lines
+
+
+def format_labels(labels: Labels) -> str:
+	if not labels:
+		return ""
+	escaped = (
+		(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+		for k, v in labels
+	)
+	return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_metric(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, Any]]) -> List[str]:
+	lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+	lines.extend(f"{name}{format_labels(labels)} {value}" for labels, value in samples)
+	return lines
+
+
+class StatementStats:
+	def __init__(self):
+		self.calls = 0
+		self.errors = 0
+		self.rows = 0
+		self.latency = Histogram()
+
+
+class QueryMetrics:
+	"""Per-statement-shape query statistics.
+
+	A statement's shape is its text with placeholders, e.g. the output of a build_*_query
+	builder, so all lookups of a student by ID are counted together.
+
+	:param slow_query_seconds: Queries taking at least this long are logged as warnings
+		on the "db" logger. None turns the slow query log off.
+	:param max_statements: The most shapes tracked separately. Shapes seen after that are
+		counted together as OVERFLOW_STATEMENT, so clients can't grow the number of series
+		without bound.
+	"""
+
+	def __init__(self, slow_query_seconds: Optional[float] = 1.0, max_statements: int = 500):
+		self.slow_query_seconds = slow_query_seconds
+		self.max_statements = max_statements
+		self._lock = threading.Lock()
+		self._statements: Dict[str, StatementStats] = {}
+
+	def observe(self, statement: str, seconds: float, rows: int = 0, error: bool = False):
+		"""Records one execution of statement.
+
+		:param statement: The shape of the statement
+		:param seconds: How long it took
+		:param rows: Rows returned or affected
+		:param error: Whether it raised
+		"""
+		with self._lock:
+			stats = self._statements.get(statement)
+			if stats is None:
+				if len(self._statements) >= self.max_statements:
+					statement = OVERFLOW_STATEMENT
+					stats = self._statements.get(statement)
+				if stats is None:
+					stats = self._statements[statement] = StatementStats()
+			stats.calls += 1
+			stats.rows += rows
+			if error:
+				stats.errors += 1
+			stats.latency.observe(seconds)
+
+		if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+			logger.warning("slow query (%.3fs, %d rows%s): %s", seconds, rows, ", failed" if error else "", statement)
+
+	def snapshot(self) -> Dict[str, Dict[str, Any]]:
+		"""Returns call counts, errors, rows and latency percentiles per statement shape."""
+		with self._lock:
+			return {
+				statement: {
+					"calls": stats.calls,
+					"errors": stats.errors,
+					"rows": stats.rows,
+					"total_seconds": stats.latency.sum,
+					"p50_seconds": stats.latency.quantile(0.5),
+					"p99_seconds": stats.latency.quantile(0.99),
+				}
+				for statement, stats in self._statements.items()
+			}
+
+	def render(self) -> List[str]:
+		"""Renders the statistics in the Prometheus text format."""
+		with self._lock:
+			items = [((("statement", statement),), stats) for statement, stats in self._statements.items()]
+			lines = []
+			lines += render_metric("db_queries_total", "counter", "Queries executed.", ((l, s.calls) for l, s in items))
+			lines += render_metric("db_query_errors_total", "counter", "Queries that raised.", ((l, s.errors) for l, s in items))
+			lines += render_metric("db_query_rows_total", "counter", "Rows returned or affected.", ((l, s.rows) for l, s in items))
+			lines += ["# HELP db_query_duration_seconds Query latency.", "# TYPE db_query_duration_seconds histogram"]
+			for labels, stats in items:
+				lines += stats.latency.render("db_query_duration_seconds", labels)
+		return lines
+
+
+class RequestMetrics:
+	"""Per-route HTTP request latency, keyed on method, route template and status code."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._latency: Dict[Labels, Histogram] = {}
+
+	def observe(self, method: str, route: str, status_code: int, seconds: float):
+		labels = (("method", method), ("route", route), ("status", str(status_code)))
+		with self._lock:
+			histogram = self._latency.get(labels)
+			if histogram is None:
+				histogram = self._latency[labels] = Histogram()
+			histogram.observe(seconds)
+
+	def render(self) -> List[str]:
+		lines = ["# HELP http_request_duration_seconds Request latency.", "# TYPE http_request_duration_seconds histogram"]
+		with self._lock:
+			for labels, histogram in self._latency.items():
+				lines += histogram.render("http_request_duration_seconds", labels)
+		return lines
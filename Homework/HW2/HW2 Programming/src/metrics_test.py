@@ -0,0 +1,78 @@
+import unittest
+
+from metrics import OVERFLOW_STATEMENT, Histogram, QueryMetrics, RequestMetrics, format_labels
+
+
+class HistogramTest(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(
+            [
+                'latency_bucket{le="0.1"} 2',
+                'latency_bucket{le="1.0"} 3',
+                'latency_bucket{le="+Inf"} 4',
+                'latency_sum 2.65',
+                'latency_count 4',
+            ],
+            histogram.render("latency", ()),
+        )
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.05, 0.05, 0.5):
+            histogram.observe(value)
+        self.assertEqual(0.1, histogram.quantile(0.5))
+        self.assertEqual(1.0, histogram.quantile(0.99))
+        self.assertEqual(0.0, Histogram().quantile(0.5))
+
+
+class QueryMetricsTest(unittest.TestCase):
+    def test_observe(self):
+        metrics = QueryMetrics(slow_query_seconds=None)
+        metrics.observe("SELECT * FROM student WHERE ID = %s", 0.002, 1)
+        metrics.observe("SELECT * FROM student WHERE ID = %s", 0.004, 0, error=True)
+
+        stats = metrics.snapshot()["SELECT * FROM student WHERE ID = %s"]
+        self.assertEqual(2, stats["calls"])
+        self.assertEqual(1, stats["errors"])
+        self.assertEqual(1, stats["rows"])
+
+    def test_statement_shapes_are_bounded(self):
+        metrics = QueryMetrics(slow_query_seconds=None, max_statements=2)
+        for i in range(5):
+            metrics.observe(f"SELECT c{i} FROM student", 0.001)
+        metrics.observe("SELECT c0 FROM student", 0.001)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(["SELECT c0 FROM student", "SELECT c1 FROM student", OVERFLOW_STATEMENT], list(snapshot))
+        self.assertEqual(2, snapshot["SELECT c0 FROM student"]["calls"])
+        self.assertEqual(3, snapshot[OVERFLOW_STATEMENT]["calls"])
+
+    def test_slow_query_log(self):
+        metrics = QueryMetrics(slow_query_seconds=0.5)
+        with self.assertLogs("db", level="WARNING") as logs:
+            metrics.observe("SELECT * FROM student", 0.1, 10)
+            metrics.observe("SELECT * FROM takes", 0.7, 10)
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("SELECT * FROM takes", logs.output[0])
+
+
+class RequestMetricsTest(unittest.TestCase):
+    def test_render(self):
+        metrics = RequestMetrics()
+        metrics.observe("GET", "/students/{student_id}", 200, 0.01)
+        lines = metrics.render()
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="/students/{student_id}",status="200"} 1',
+            lines,
+        )
+
+    def test_label_escaping(self):
+        self.assertEqual('{statement="WHERE name = \\"x\\""}', format_labels((("statement", 'WHERE name = "x"'),)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Iterator, Optional, Tuple, Type
+
+import pymysql
+
+# Errors after which a connection can no longer be trusted and must be thrown away
+# instead of being put back into the pool.
+BROKEN_CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+class PoolTimeout(Exception):
+	"""Raised when no connection could be checked out of the pool in time."""
+
+
+class ConnectionPool:
+	"""A bounded, thread-safe pool of database connections.
+
+	Connections are created lazily by `connect` up to `max_size`. Callers that find
+	the pool exhausted wait up to `timeout` seconds for a connection to be returned.
+	Connections idle for longer than `max_idle` seconds are closed (but the pool never
+	shrinks below `min_size`), and connections idle for longer than `ping_interval`
+	seconds are pinged before being handed out.
+
+	Connections that raise one of `broken_errors` while borrowed are closed instead of
+	being put back.
+	"""
+
+	def __init__(
+		self,
+		connect: Callable[[], Any],
+		min_size: int = 1,
+		max_size: int = 10,
+		timeout: float = 10.0,
+		max_idle: float = 300.0,
+		ping_interval: float = 30.0,
+		broken_errors: Tuple[Type[BaseException], ...] = BROKEN_CONNECTION_ERRORS,
+	):
+		if min_size < 0 or max_size < 1 or min_size > max_size:
+			raise ValueError(f"invalid pool bounds: min_size={min_size}, max_size={max_size}")
+
+		self.connect = connect
+		self.min_size = min_size
+		self.max_size = max_size
+		self.timeout = timeout
+		self.max_idle = max_idle
+		self.ping_interval = ping_interval
+		self.broken_errors = broken_errors
+
+		self._cond = threading.Condition()
+		# (connection, time it was returned to the pool); most recently used on the right
+		self._idle: Deque[Tuple[Any, float]] = deque()
+		# Number of open connections, both idle and checked out
+		self._size = 0
+		self._closed = False
+
+		for _ in range(min_size):
+			self._idle.append((self.connect(), time.monotonic()))
+			self._size += 1
+
+	@property
+	def size(self) -> int:
+		return self._size
+
+	@property
+	def idle(self) -> int:
+		return len(self._idle)
+
+	def acquire(self, timeout: Optional[float] = None) -> Any:
+		"""Checks a connection out of the pool.
+
+		:param timeout: Seconds to wait for a free connection, instead of the pool timeout.
+			0 doesn't wait at all.
+		:returns: A healthy connection. It must be given back with release.
+		:raises PoolTimeout: If no connection became available within the timeout.
+		"""
+		if timeout is None:
+			timeout = self.timeout
+		deadline = time.monotonic() + timeout
+		while True:
+			with self._cond:
+				if self._closed:
+					raise RuntimeError("connection pool is closed")
+				self._reap_idle_locked()
+
+				if self._idle:
+					conn, idle_since = self._idle.pop()
+				elif self._size < self.max_size:
+					self._size += 1
+					conn, idle_since = None, None
+				else:
+					remaining = deadline - time.monotonic()
+					if remaining <= 0 or not self._cond.wait(remaining):
+						raise PoolTimeout(f"no connection available after {timeout}s")
+					continue
+
+			# Connecting and pinging happen outside the lock so they don't block other threads
+			if conn is None:
+				try:
+					return self.connect()
+				except BaseException:
+					self._discard()
+					raise
+
+			if time.monotonic() - idle_since < self.ping_interval or self._is_healthy(conn):
+				return conn
+			self._close_quietly(conn)
+			self._discard()
+
+	def release(self, conn: Any, broken: bool = False):
+		"""Returns a connection to the pool.
+
+		:param conn: A connection previously returned by acquire
+		:param broken: If True, the connection is closed instead of being reused
+		"""
+		if broken or self._closed:
+			self._close_quietly(conn)
+			self._discard()
+			return
+
+		with self._cond:
+			self._idle.append((conn, time.monotonic()))
+			self._cond.notify()
+
+	@contextmanager
+	def connection(self) -> Iterator[Any]:
+		"""Borrows a connection for the duration of a with block."""
+		conn = self.acquire()
+		try:
+			yield conn
+		except BaseException as e:
+			self.release(conn, broken=isinstance(e, self.broken_errors))
+			raise
+		else:
+			self.release(conn)
+
+	def reap_idle(self) -> int:
+		"""Closes connections that have been idle for longer than max_idle.
+
+		:returns: The number of connections closed
+		"""
+		with self._cond:
+			return self._reap_idle_locked()
+
+	def close(self):
+		"""Closes all idle connections. Connections still checked out are closed when released."""
+		with self._cond:
+			self._closed = True
+			while self._idle:
+				conn, _ = self._idle.popleft()
+				self._close_quietly(conn)
+				self._size -= 1
+			self._cond.notify_all()
+
+	def _reap_idle_locked(self) -> int:
+		now = time.monotonic()
+		n_closed = 0
+		# The least recently used connections are on the left
+		while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+			conn, _ = self._idle.popleft()
+			self._close_quietly(conn)
+			self._size -= 1
+			n_closed += 1
+		return n_closed
+
+	def _discard(self):
+		with self._cond:
+			self._size -= 1
+			self._cond.notify()
+
+	@staticmethod
+	def _is_healthy(conn: Any) -> bool:
+		try:
+			conn.ping(reconnect=False)
+			return True
+		except Exception:
+			return False
+
+	@staticmethod
+	def _close_quietly(conn: Any):
+		try:
+			conn.close()
+		except Exception:
+			pass
@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+import pymysql
+
+from pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def ping(self, reconnect=False):
+        if not self.healthy:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        self.created = []
+
+        def connect():
+            conn = FakeConnection()
+            self.created.append(conn)
+            return conn
+
+        return ConnectionPool(connect, **kwargs)
+
+    def test_min_size_opened_eagerly(self):
+        pool = self.make_pool(min_size=3, max_size=5)
+        self.assertEqual(3, len(self.created))
+        self.assertEqual(3, pool.size)
+        self.assertEqual(3, pool.idle)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(min_size=0, max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(1, len(self.created))
+
+    def test_max_size_and_timeout(self):
+        pool = self.make_pool(min_size=0, max_size=2, timeout=0.05)
+        a = pool.acquire()
+        b = pool.acquire()
+        self.assertIsNot(a, b)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(a)
+        self.assertIs(a, pool.acquire())
+
+    def test_acquire_timeout_overrides_pool_timeout(self):
+        pool = self.make_pool(min_size=0, max_size=1, timeout=10.0)
+        pool.acquire()
+        start = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(0)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_waiter_is_woken_by_release(self):
+        pool = self.make_pool(min_size=0, max_size=1, timeout=5)
+        conn = pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(conn)
+        waiter.join(1)
+        self.assertEqual([conn], got)
+
+    def test_broken_connection_is_discarded(self):
+        pool = self.make_pool(min_size=0, max_size=1)
+        with self.assertRaises(pymysql.err.OperationalError):
+            with pool.connection():
+                raise pymysql.err.OperationalError(2013, "Lost connection")
+        self.assertEqual(0, pool.size)
+        self.assertTrue(self.created[0].closed)
+
+        # Other errors don't invalidate the connection
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError()
+        self.assertEqual(1, pool.idle)
+
+    def test_health_check(self):
+        pool = self.make_pool(min_size=1, max_size=1, ping_interval=0)
+        self.created[0].healthy = False
+        conn = pool.acquire()
+        self.assertIs(self.created[1], conn)
+        self.assertTrue(self.created[0].closed)
+
+    def test_idle_reaping_keeps_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=3, max_idle=0)
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertEqual(2, pool.reap_idle())
+        self.assertEqual(1, pool.size)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            self.make_pool(min_size=3, max_size=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import datetime
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+import responses
+from responses import FastJSONResponse, PrerenderedJSONResponse, dumps
+
+
+class DumpsTest(unittest.TestCase):
+    row = {
+        "ID": 1,
+        "name": "Joé",
+        "tot_cred": Decimal("12"),
+        "gpa": Decimal("3.75"),
+        "enrolled": datetime.date(2021, 9, 1),
+        "updated": datetime.datetime(2024, 2, 1, 12, 30),
+        "start_time": datetime.timedelta(hours=9),
+    }
+    want = (
+        '{"ID":1,"name":"Joé","tot_cred":12,"gpa":3.75,"enrolled":"2021-09-01",'
+        '"updated":"2024-02-01T12:30:00","start_time":32400.0}'
+    ).encode()
+
+    def test_mysql_types(self):
+        self.assertEqual(self.want, dumps(self.row))
+
+    def test_without_orjson(self):
+        with mock.patch.object(responses, "orjson", None):
+            self.assertEqual(self.want, dumps(self.row))
+
+    def test_unknown_type(self):
+        with self.assertRaises(TypeError):
+            dumps({"x": object()})
+
+
+class ResponseTest(unittest.TestCase):
+    def test_fast_json_response(self):
+        response = FastJSONResponse(content=[{"d": datetime.date(2024, 1, 2)}], status_code=200)
+        self.assertEqual(b'[{"d":"2024-01-02"}]', response.body)
+        self.assertEqual("application/json", response.media_type)
+
+    def test_prerendered_json_response(self):
+        response = PrerenderedJSONResponse(b'"bad request"', status_code=400)
+        self.assertEqual(b'"bad request"', response.body)
+        self.assertEqual(400, response.status_code)
+        self.assertEqual("application/json", response.headers["content-type"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import re
+from typing import Any, Dict, Iterable, List
+
+# Key-value pairs
+KV = Dict[str, Any]
+
+COLUMNS_QUERY = (
+	"SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name, DATA_TYPE AS data_type, "
+	"IS_NULLABLE AS is_nullable "
+	"FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s "
+	"ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+INDEXES_QUERY = (
+	"SELECT TABLE_NAME AS table_name, INDEX_NAME AS index_name, COLUMN_NAME AS column_name, "
+	"NON_UNIQUE AS non_unique "
+	"FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s "
+	"ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+)
+
+INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "year"}
+INTEGER_PATTERN = re.compile(r"[+-]?\d+")
+
+
+class SchemaError(ValueError):
+	"""Raised when a statement refers to a table or column that doesn't exist, or gives an
+	integer column a value that isn't an integer.
+	"""
+
+
+class Column:
+	def __init__(self, name: str, data_type: str, nullable: bool):
+		self.name = name
+		self.data_type = data_type
+		self.nullable = nullable
+
+	def accepts(self, value: Any) -> bool:
+		"""Whether value could be stored in the column, as far as can be told without MySQL."""
+		if value is None:
+			return self.nullable
+		if self.data_type in INTEGER_TYPES:
+			if isinstance(value, str):
+				return INTEGER_PATTERN.fullmatch(value.strip()) is not None
+			return isinstance(value, int) and not isinstance(value, bool)
+		return True
+
+
+class TableSchema:
+	"""The columns, keys and unique indexes of one table, as read from INFORMATION_SCHEMA."""
+
+	def __init__(self, name: str, columns: List[Column]):
+		self.name = name
+		self.columns: Dict[str, Column] = {column.name: column for column in columns}
+		self.primary_key: List[str] = []
+		# Columns of every unique index other than the primary key
+		self.unique_indexes: List[List[str]] = []
+
+	@property
+	def unique_columns(self) -> List[str]:
+		"""Columns that are unique on their own, other than the primary key."""
+		return [index[0] for index in self.unique_indexes if len(index) == 1]
+
+	def check_names(self, names: Iterable[str]):
+		"""Raises SchemaError if any of names isn't a column of the table."""
+		unknown = [name for name in names if name not in self.columns]
+		if unknown:
+			raise SchemaError(f"unknown column(s) {', '.join(unknown)} in table {self.name}")
+
+	def check_values(self, values: KV):
+		"""Raises SchemaError if values has unknown columns or values the columns can't hold."""
+		self.check_names(values)
+		for name, value in values.items():
+			if not self.columns[name].accepts(value):
+				raise SchemaError(f"invalid value {value!r} for {self.name}.{name} ({self.columns[name].data_type})")
+
+	def check_value(self, name: str, value: Any):
+		"""Raises SchemaError if name isn't a column, or value can't be compared to it.
+
+		Unlike check_values, None is accepted for any column: it stands for a condition with no
+		column value, such as IS NULL.
+		"""
+		self.check_names([name])
+		if value is not None and not self.columns[name].accepts(value):
+			raise SchemaError(f"invalid value {value!r} for {self.name}.{name} ({self.columns[name].data_type})")
+
+
+def parse_schema(column_rows: Iterable[KV], index_rows: Iterable[KV]) -> Dict[str, TableSchema]:
+	"""Builds a TableSchema per table from the results of COLUMNS_QUERY and INDEXES_QUERY."""
+	columns: Dict[str, List[Column]] = {}
+	for row in column_rows:
+		column = Column(row["column_name"], row["data_type"].lower(), row["is_nullable"] == "YES")
+		columns.setdefault(row["table_name"], []).append(column)
+	tables = {name: TableSchema(name, table_columns) for name, table_columns in columns.items()}
+
+	indexes: Dict[tuple, List[str]] = {}
+	for row in index_rows:
+		if int(row["non_unique"]) == 0:
+			indexes.setdefault((row["table_name"], row["index_name"]), []).append(row["column_name"])
+	for (table_name, index_name), index_columns in indexes.items():
+		table = tables.get(table_name)
+		if table is None:
+			continue
+		if index_name == "PRIMARY":
+			table.primary_key = index_columns
+		else:
+			table.unique_indexes.append(index_columns)
+
+	return tables
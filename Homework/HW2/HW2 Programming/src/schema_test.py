@@ -0,0 +1,61 @@
+import unittest
+
+from schema import Column, SchemaError, parse_schema
+
+COLUMN_ROWS = [
+    {"table_name": "student", "column_name": "student_id", "data_type": "int", "is_nullable": "NO"},
+    {"table_name": "student", "column_name": "email", "data_type": "varchar", "is_nullable": "NO"},
+    {"table_name": "student", "column_name": "middle_name", "data_type": "varchar", "is_nullable": "YES"},
+    {"table_name": "enrollment", "column_name": "student_id", "data_type": "int", "is_nullable": "NO"},
+    {"table_name": "enrollment", "column_name": "course_id", "data_type": "int", "is_nullable": "NO"},
+]
+INDEX_ROWS = [
+    {"table_name": "student", "index_name": "PRIMARY", "column_name": "student_id", "non_unique": 0},
+    {"table_name": "student", "index_name": "email", "column_name": "email", "non_unique": 0},
+    {"table_name": "student", "index_name": "by_name", "column_name": "middle_name", "non_unique": 1},
+    {"table_name": "enrollment", "index_name": "PRIMARY", "column_name": "student_id", "non_unique": 0},
+    {"table_name": "enrollment", "index_name": "PRIMARY", "column_name": "course_id", "non_unique": 0},
+]
+
+
+class ParseSchemaTest(unittest.TestCase):
+    def test_keys_and_unique_indexes(self):
+        tables = parse_schema(COLUMN_ROWS, INDEX_ROWS)
+        self.assertEqual({"student", "enrollment"}, set(tables))
+        self.assertEqual(["student_id"], tables["student"].primary_key)
+        self.assertEqual(["email"], tables["student"].unique_columns)
+        self.assertEqual(["student_id", "course_id"], tables["enrollment"].primary_key)
+        self.assertEqual([], tables["enrollment"].unique_columns)
+
+    def test_check_names(self):
+        student = parse_schema(COLUMN_ROWS, INDEX_ROWS)["student"]
+        student.check_names(["email", "student_id"])
+        with self.assertRaises(SchemaError):
+            student.check_names(["email", "bogus"])
+
+    def test_check_values(self):
+        student = parse_schema(COLUMN_ROWS, INDEX_ROWS)["student"]
+        student.check_values({"student_id": "12", "middle_name": None})
+        with self.assertRaises(SchemaError):
+            student.check_values({"student_id": "abc"})
+        with self.assertRaises(SchemaError):
+            student.check_values({"email": None})
+
+
+class ColumnTest(unittest.TestCase):
+    def test_integer_column(self):
+        column = Column("ID", "int", nullable=False)
+        self.assertTrue(column.accepts(1))
+        self.assertTrue(column.accepts(" -3 "))
+        self.assertFalse(column.accepts("1.5"))
+        self.assertFalse(column.accepts(True))
+        self.assertFalse(column.accepts(None))
+
+    def test_other_columns_accept_anything_but_null(self):
+        column = Column("email", "varchar", nullable=True)
+        self.assertTrue(column.accepts("a@b.c"))
+        self.assertTrue(column.accepts(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
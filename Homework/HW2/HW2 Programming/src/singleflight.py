@@ -0,0 +1,72 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+	def __init__(self):
+		self.done = threading.Event()
+		self.result: Any = None
+		self.error: Optional[BaseException] = None
+		self.waiters = 0
+
+
+class SingleFlight:
+	"""Coalesces concurrent calls that would do the same work.
+
+	The first caller with a given key runs the function; callers that arrive with the same key
+	while it is running wait for it and get its result (or its exception) instead of running
+	the function again. Once the call returns the key is forgotten, so nothing is cached.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._calls: Dict[Hashable, _Call] = {}
+		self.calls = 0
+		self.shared = 0
+
+	def do(self, key: Hashable, func: Callable[[], Any], copy: Optional[Callable[[Any], Any]] = None) -> Any:
+		"""Runs func, or waits for the call already running under key.
+
+		:param key: Identifies the work. Unhashable keys aren't coalesced.
+		:param func: Does the work
+		:param copy: Applied to the result for each caller when the call was shared, so callers
+			can modify what they get back without affecting each other
+		:returns: The result of func
+		"""
+		try:
+			hash(key)
+		except TypeError:
+			return func()
+
+		with self._lock:
+			self.calls += 1
+			call = self._calls.get(key)
+			leader = call is None
+			if leader:
+				call = self._calls[key] = _Call()
+			else:
+				call.waiters += 1
+				self.shared += 1
+
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return copy(call.result) if copy is not None else call.result
+
+		try:
+			call.result = func()
+		except BaseException as e:
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				del self._calls[key]
+				shared = call.waiters > 0
+			call.done.set()
+		# Nobody else can join now; the waiters copy call.result, so it must stay untouched
+		return copy(call.result) if shared and copy is not None else call.result
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
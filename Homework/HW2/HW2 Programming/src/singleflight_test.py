@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def run_concurrently(self, flights, n, func, copy=None):
+        results = [None] * n
+        errors = [None] * n
+
+        def call(i):
+            try:
+                results[i] = flights.do("key", func, copy)
+            except Exception as e:
+                errors[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def func():
+            executions.append(1)
+            release.wait(5)
+            return [{"ID": 1}]
+
+        threads, results, errors = self.run_concurrently(flights, 5, func, lambda rows: [dict(r) for r in rows])
+        # Let every caller join before the first one finishes
+        while flights.stats()["shared"] < 4:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(executions))
+        self.assertEqual([[{"ID": 1}]] * 5, results)
+        # Each caller got its own copy
+        self.assertEqual(5, len({id(rows) for rows in results}))
+        self.assertEqual({"calls": 5, "shared": 4, "in_flight": 0}, flights.stats())
+
+    def test_waiters_get_the_exception(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def func():
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        threads, results, errors = self.run_concurrently(flights, 3, func)
+        while flights.stats()["shared"] < 2:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+
+    def test_sequential_calls_are_not_cached(self):
+        flights = SingleFlight()
+        results = iter([1, 2])
+        self.assertEqual(1, flights.do("key", lambda: next(results)))
+        self.assertEqual(2, flights.do("key", lambda: next(results)))
+
+    def test_unhashable_key(self):
+        self.assertEqual(1, SingleFlight().do(["key"], lambda: 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,407 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import pymysql
+
+# The transforms and writers don't use pandas, only the notebook does
+sys.modules.setdefault("pandas", types.ModuleType("pandas"))
+
+import process_got
+
+# Two episodes shaped like those in episodes.json
+EPISODES = [
+    {
+        "seasonNum": 1, "episodeNum": 1, "episodeTitle": "Winter Is Coming", "episodeLink": "/title/tt1480055/",
+        "episodeAirDate": "2011-04-17", "episodeDescription": "Eddard Stark is torn between his family and an old friend.",
+        "openingSequenceLocations": ["King's Landing", "Winterfell"],
+        "scenes": [
+            {"sceneStart": "0:00:40", "sceneEnd": "0:01:45", "location": "The Wall",
+             "characters": [{"name": "Waymar Royce"}, {"name": "Will"}]},
+            {"sceneStart": "0:01:45", "sceneEnd": "0:03:24", "location": "North of the Wall",
+             "subLocation": "The Haunted Forest", "characters": [{"name": "Gared"}]},
+        ],
+    },
+    {
+        "seasonNum": 1, "episodeNum": 2, "episodeTitle": "The Kingsroad", "episodeLink": "/title/tt1668746/",
+        "episodeAirDate": "2011-04-24", "episodeDescription": "While Bran recovers, \"Ned\" goes south.\nA, \"quoted\", line",
+        "scenes": [{"sceneStart": "0:00:00", "sceneEnd": "0:00:30"}],
+    },
+]
+
+
+class JSONStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, text):
+        file_name = os.path.join(self.dir.name, "in.json")
+        with open(file_name, "w") as out_file:
+            out_file.write(text)
+        return file_name
+
+    def test_elements_match_json_load(self):
+        document = {
+            "before": {"skipped": [1, 2.5, "x", None]},
+            "episodes": [
+                {"seasonNum": 1, "episodeNum": 10, "title": "Fire and Blood"},
+                {"seasonNum": 2, "openingSequenceLocations": ["King's Landing", "Winterfell"]},
+                {"escaped": "a \"quoted\" \\ line\nbreak", "unicode": "é☃", "nested": [[], {}]},
+                {"numbers": [0, -1, 12345678901234567890, 1.5e-10, 3.25], "flags": [True, False, None]},
+            ],
+            "after": "ignored",
+        }
+        want = document["episodes"]
+        for indent in (None, 2):
+            file_name = self.write(json.dumps(document, indent=indent))
+            for chunk_size in range(1, 40):
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(want, list(process_got.iter_json_array(file_name, "episodes", chunk_size)))
+
+    def test_numbers_split_across_chunks(self):
+        # Every split of the number lands on a chunk boundary at one of these chunk sizes
+        text = '{"values": [12345.678e-2, 987654321]}'
+        file_name = self.write(text)
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    [12345.678e-2, 987654321],
+                    list(process_got.iter_json_array(file_name, "values", chunk_size)),
+                )
+
+    def test_missing_key(self):
+        for text in ('{"characters": [1, 2], "other": {"episodes": []}}', "{}"):
+            with self.subTest(text=text):
+                with self.assertRaises(KeyError):
+                    list(process_got.iter_json_array(self.write(text), "episodes", 4))
+
+    def test_empty(self):
+        for text in ('{"episodes": []}', '{ "episodes" : [ \n ] }', '{"a": 1, "episodes": []}'):
+            with self.subTest(text=text):
+                self.assertEqual([], list(process_got.iter_json_array(self.write(text), "episodes", 3)))
+        # Stops at the end of the array without reading on
+        self.assertEqual([], list(process_got.iter_json_array(self.write('{"episodes": [], "x": '), "episodes")))
+
+
+class EpisodesTest(unittest.TestCase):
+    def test_get_returns_lists(self):
+        with mock.patch.object(process_got, "iter_episodes", side_effect=lambda: iter(EPISODES)):
+            episodes = process_got.get_episodes()
+        self.assertEqual(EPISODES, episodes)
+        self.assertEqual(1, episodes[0]["episodeNum"])
+        basics = process_got.get_episodes_basics(episodes)
+        self.assertEqual([1, 2], [e["episodeNum"] for e in basics])
+        # A list can be walked again, unlike a generator
+        self.assertEqual(basics, list(basics))
+        self.assertEqual(3, len(process_got.get_episodes_basics_scenes_characters(episodes)))
+
+    def test_iter_streams(self):
+        rows = process_got.iter_episodes_basics_location(iter(EPISODES))
+        self.assertEqual({"seasonNum": 1, "episodeNum": 1, "openingSequenceLocation": "King's Landing"}, next(rows))
+
+
+class WriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_rows(self, writer, rows):
+        with writer as w:
+            for row in rows:
+                w.write(row)
+        return writer.file_name
+
+    def test_json_array_matches_json_dump(self):
+        rows = [
+            {"seasonNum": 1, "title": "Winter Is Coming", "locations": ["North", "Winterfell"], "extra": {}},
+            {"seasonNum": 2, "title": "Valar Morghulis", "locations": [], "extra": {"nested": [1, None]}},
+            {"seasonNum": 3, "title": "é", "locations": None, "extra": {"flag": True}},
+        ]
+        for n in range(len(rows) + 1):
+            with self.subTest(n_rows=n):
+                file_name = os.path.join(self.dir.name, "rows.json")
+                self.write_rows(process_got.JSONArrayWriter(file_name), rows[:n])
+                want = os.path.join(self.dir.name, "want.json")
+                with open(want, "w") as out_file:
+                    json.dump(rows[:n], out_file, indent=2)
+                with open(file_name, "rb") as got_file, open(want, "rb") as want_file:
+                    self.assertEqual(want_file.read(), got_file.read())
+
+    def test_ndjson_round_trip(self):
+        rows = [
+            {"seasonNum": 1, "title": "Winter Is Coming", "locations": ["North", "Winterfell"]},
+            {"seasonNum": 2, "title": "line\nbreak, \"quoted\" é☃", "locations": None},
+        ]
+        file_name = self.write_rows(process_got.NDJSONWriter(os.path.join(self.dir.name, "rows.ndjson")), rows)
+        with open(file_name, encoding="utf-8") as in_file:
+            lines = in_file.read().split("\n")
+        # One line per row, each ending in a newline
+        self.assertEqual(len(rows) + 1, len(lines))
+        self.assertEqual("", lines[-1])
+        self.assertEqual(rows, [json.loads(line) for line in lines[:-1]])
+        self.assertIn("é☃", lines[1])
+
+    def test_csv_round_trip(self):
+        rows = [
+            {"seasonNum": 1, "title": "Winter Is Coming", "locations": ["North", "King's Landing"], "sub": None},
+            {"seasonNum": 2, "title": 'line\nbreak, "quoted" é', "locations": {"a": [1, None]}, "sub": "The Wall"},
+        ]
+        file_name = self.write_rows(process_got.CSVWriter(os.path.join(self.dir.name, "rows.csv")), rows)
+        with open(file_name, encoding="utf-8", newline="") as in_file:
+            header = in_file.readline()
+            in_file.seek(0)
+            got = list(csv.DictReader(in_file))
+        self.assertEqual("seasonNum,title,locations,sub\r\n", header)
+        self.assertEqual([
+            {"seasonNum": "1", "title": "Winter Is Coming", "locations": '["North","King\'s Landing"]', "sub": ""},
+            {"seasonNum": "2", "title": 'line\nbreak, "quoted" é', "locations": '{"a":[1,null]}', "sub": "The Wall"},
+        ], got)
+        self.assertEqual({"a": [1, None]}, json.loads(got[1]["locations"]))
+
+    def test_process_all_formats_read_back(self):
+        rows = {output: [] for output in process_got.episode_outputs}
+        for output, row in process_got.transform_episodes(EPISODES):
+            rows[output].append(row)
+        for fmt in ("ndjson", "csv"):
+            directory = os.path.join(self.dir.name, fmt)
+            os.mkdir(directory)
+            write_all(directory, fmt)
+            for output in process_got.episode_outputs:
+                with self.subTest(fmt=fmt, output=output):
+                    with open(os.path.join(directory, output + "." + fmt), encoding="utf-8", newline="") as in_file:
+                        if fmt == "ndjson":
+                            self.assertEqual(rows[output], [json.loads(line) for line in in_file])
+                        else:
+                            want = [{k: "" if v is None else str(v) for k, v in row.items()} for row in rows[output]]
+                            self.assertEqual(want, list(csv.DictReader(in_file)))
+
+    def test_columnar_round_trip(self):
+        rows = [
+            {
+                "seasonNum": i // 4,
+                # An int column in some blocks that has a None in others
+                "sceneEnd": None if i == 9 else i * 60,
+                "location": ["North", "The Wall", "King's Landing"][i % 3],
+                "subLocation": None if i % 2 else "Winterfell",
+                "big": 2 ** 62 if i % 5 else -2 ** 63,
+                "characters": [f"c{i}"] * (i % 3),
+            }
+            for i in range(23)
+        ]
+        for group_size in (1, 2, 3, 4096):
+            with self.subTest(group_size=group_size):
+                file_name = os.path.join(self.dir.name, "rows.gotcol")
+                self.write_rows(process_got.ColumnarWriter(file_name, group_size), rows)
+                self.assertEqual(rows, list(process_got.iter_columnar(file_name)))
+
+    def test_columnar_empty(self):
+        file_name = os.path.join(self.dir.name, "rows.gotcol")
+        self.write_rows(process_got.ColumnarWriter(file_name), [])
+        self.assertEqual([], list(process_got.iter_columnar(file_name)))
+
+    def test_columnar_rejects_other_files(self):
+        file_name = os.path.join(self.dir.name, "rows.json")
+        self.write_rows(process_got.JSONArrayWriter(file_name), [{"a": 1}])
+        with self.assertRaises(ValueError):
+            list(process_got.iter_columnar(file_name))
+
+
+def write_all(directory, fmt="json", **kwargs):
+    """Runs process_all on EPISODES, writing the files to directory."""
+    extension, writer = process_got.file_formats[fmt]
+    process_got.process_all(
+        episodes=iter(EPISODES),
+        open_sink=lambda output: writer(os.path.join(directory, output + extension)),
+        **kwargs,
+    )
+
+
+def read_files(directory):
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as in_file:
+            files[name] = in_file.read()
+    return files
+
+
+class ProcessAllTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def subdir(self, name):
+        path = os.path.join(self.dir.name, name)
+        os.mkdir(path)
+        return path
+
+    def test_parallel_matches_sequential(self):
+        episodes = EPISODES * 5
+        want = list(process_got.transform_episodes(episodes))
+        for workers, shard_size in ((2, 1), (2, 3), (3, 100)):
+            with self.subTest(workers=workers, shard_size=shard_size):
+                got = list(process_got.iter_parallel(process_got.transform_episodes, iter(episodes), workers, shard_size))
+                self.assertEqual(want, got)
+
+        sequential, parallel = self.subdir("sequential"), self.subdir("parallel")
+        write_all(sequential)
+        write_all(parallel, workers=2, shard_size=1)
+        self.assertEqual(read_files(sequential), read_files(parallel))
+
+    def test_single_pass_matches_the_process_functions(self):
+        # Both write to the working directory
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        for fmt in process_got.file_formats:
+            with self.subTest(fmt=fmt), \
+                    mock.patch.object(process_got, "iter_episodes", side_effect=lambda: iter(EPISODES)):
+                separate, single_pass = self.subdir(f"separate_{fmt}"), self.subdir(f"single_pass_{fmt}")
+                os.chdir(separate)
+                process_got.process_episodes(fmt)
+                process_got.process_locations(fmt)
+                process_got.process_scenes(fmt)
+                process_got.process_episodes_characters(fmt)
+                os.chdir(single_pass)
+                process_got.process_all(fmt=fmt)
+                files = read_files(separate)
+                self.assertEqual(
+                    sorted(output + process_got.file_formats[fmt][0] for output in process_got.episode_outputs),
+                    list(files),
+                )
+                self.assertEqual(files, read_files(single_pass))
+
+
+class FakeConnection:
+    """Records the statements a MySQLTableLoader runs, with commits and rollbacks. The INSERT
+    batch number fail_batch raises, if given."""
+
+    def __init__(self, fail_batch=None):
+        self.statements = []
+        self.fail_batch = fail_batch
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, args=None):
+        self.statements.append(query)
+
+    def executemany(self, query, rows):
+        if self.fail_batch is not None and sum(isinstance(q, tuple) for q in self.statements) == self.fail_batch:
+            raise pymysql.err.DataError(1406, "Data too long for column 'openingSequenceLocation'")
+        self.statements.append((query, list(rows)))
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+    def select_db(self, database):
+        pass
+
+    def close(self):
+        pass
+
+
+COLUMNS = "`seasonNum` BIGINT, `episodeNum` BIGINT, `openingSequenceLocation` TEXT"
+
+
+def insert(table, rows):
+    return (
+        f"INSERT INTO `{table}` (`seasonNum`, `episodeNum`, `openingSequenceLocation`) VALUES (%s, %s, %s)",
+        [[1, 2, location] for location in rows],
+    )
+
+
+class MySQLTableLoaderTest(unittest.TestCase):
+    def load(self, if_exists, conn=None, locations=("Winterfell",), fail=False):
+        conn = conn or FakeConnection()
+        loader = process_got.MySQLTableLoader(conn, "episodes_opening_locations", batch_size=2, if_exists=if_exists)
+        with mock.patch("builtins.print"), loader:
+            for location in locations:
+                loader.write({"seasonNum": 1, "episodeNum": 2, "openingSequenceLocation": location})
+            if fail:
+                raise KeyError("sceneStart")
+        return conn.statements
+
+    def test_if_exists(self):
+        self.assertEqual([
+            "DROP TABLE IF EXISTS `episodes_opening_locations__loading`",
+            f"CREATE TABLE `episodes_opening_locations__loading` ({COLUMNS})",
+            insert("episodes_opening_locations__loading", ["Winterfell"]),
+            "COMMIT",
+            f"CREATE TABLE IF NOT EXISTS `episodes_opening_locations` ({COLUMNS})",
+            "RENAME TABLE `episodes_opening_locations` TO `episodes_opening_locations__replaced`, "
+            "`episodes_opening_locations__loading` TO `episodes_opening_locations`",
+            "DROP TABLE `episodes_opening_locations__replaced`",
+        ], self.load("replace"))
+        self.assertEqual([
+            f"CREATE TABLE IF NOT EXISTS `episodes_opening_locations` ({COLUMNS})",
+            insert("episodes_opening_locations", ["Winterfell"]),
+            "COMMIT",
+        ], self.load("append"))
+        self.assertEqual([
+            f"CREATE TABLE `episodes_opening_locations` ({COLUMNS})",
+            insert("episodes_opening_locations", ["Winterfell"]),
+            "COMMIT",
+        ], self.load("fail"))
+        with self.assertRaises(ValueError):
+            self.load("truncate")
+
+    def test_commits_once_per_table(self):
+        statements = self.load("append", locations=["a", "b", "c", "d", "e"])
+        self.assertEqual(["COMMIT"], [q for q in statements if q == "COMMIT"])
+        self.assertEqual("COMMIT", statements[-1])
+
+    def test_failed_load_leaves_no_partial_table(self):
+        locations = ["a", "b", "c", "d", "e"]
+        cleanup = {
+            "replace": ["ROLLBACK", "DROP TABLE IF EXISTS `episodes_opening_locations__loading`"],
+            "append": ["ROLLBACK"],
+            "fail": ["ROLLBACK", "DROP TABLE IF EXISTS `episodes_opening_locations`"],
+        }
+        messages = {
+            "replace": "episodes_opening_locations was left as it was",
+            "append": "no rows were added to episodes_opening_locations",
+            "fail": "episodes_opening_locations was dropped",
+        }
+        for if_exists in ("replace", "append", "fail"):
+            # Fails in the database, at the second batch, and while producing the rows
+            for conn, fail, cause in ((FakeConnection(fail_batch=1), False, pymysql.err.DataError),
+                                      (FakeConnection(), True, KeyError)):
+                with self.subTest(if_exists=if_exists, cause=cause.__name__):
+                    with self.assertRaises(RuntimeError) as e:
+                        self.load(if_exists, conn, locations, fail)
+                    self.assertIn(messages[if_exists], str(e.exception))
+                    self.assertIsInstance(e.exception.__cause__, cause)
+                    self.assertEqual(cleanup[if_exists], conn.statements[-len(cleanup[if_exists]):])
+                    self.assertNotIn("COMMIT", conn.statements)
+                    self.assertFalse(any(q.startswith(("RENAME", "DROP TABLE `")) for q in conn.statements if isinstance(q, str)))
+
+    def test_load_all_uses_the_notebook_tables(self):
+        conn = FakeConnection()
+        with mock.patch.object(process_got.pymysql, "connect", return_value=conn), \
+                mock.patch.object(process_got, "iter_episodes", return_value=iter(EPISODES)), \
+                mock.patch("builtins.print"):
+            process_got.load_all()
+
+        loaded = [q.split("`")[1] for q in conn.statements if isinstance(q, str) and q.startswith("RENAME TABLE")]
+        self.assertEqual(sorted(process_got.output_tables.values()), sorted(loaded))
+        self.assertIn("episodes_opening_locations", loaded)
+        inserted = {q[0].split("`")[1] for q in conn.statements if isinstance(q, tuple)}
+        self.assertEqual({f"{table}__loading" for table in loaded}, inserted)
+
+
+if __name__ == "__main__":
+    unittest.main()